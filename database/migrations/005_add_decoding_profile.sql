@@ -0,0 +1,29 @@
+-- =====================================================
+-- Migration 005: Add Decoding Profile Column
+-- =====================================================
+-- Purpose: Record which Whisper decoding profile a job
+-- was transcribed with, so speed/accuracy choices per
+-- workflow can be compared against the output
+-- - fast: greedy, English only, VAD on
+-- - accurate: beam search, automatic language detection
+-- =====================================================
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+ALTER TABLE studio_jobs 
+ADD COLUMN decoding_profile text NOT NULL DEFAULT 'accurate';
+
+COMMENT ON COLUMN studio_jobs.decoding_profile IS 'Transcriber decoding profile used for this job (fast | accurate)';
+
+-- =====================================================
+-- Verification
+-- =====================================================
+
+SELECT column_name, data_type, is_nullable, column_default
+FROM information_schema.columns
+WHERE table_name = 'studio_jobs'
+  AND column_name = 'decoding_profile';
+
+-- Expected: text, NOT NULL, default 'accurate'
+-- Existing jobs are backfilled with 'accurate' (the previous behaviour)
+-- =====================================================
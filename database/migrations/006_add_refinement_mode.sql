@@ -0,0 +1,30 @@
+-- =====================================================
+-- Migration 006: Add Refinement Mode Column
+-- =====================================================
+-- Purpose: Record how the LLM Refiner sampled a job's
+-- refined text, so reprocessing reproduces it
+-- - creative: temperature 0.7, different on every run
+-- - deterministic: greedy decoding with a fixed seed;
+--   repeat runs return the same text and are served
+--   from the refiner's result cache
+-- =====================================================
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+ALTER TABLE studio_jobs 
+ADD COLUMN refinement_mode text NOT NULL DEFAULT 'creative';
+
+COMMENT ON COLUMN studio_jobs.refinement_mode IS 'LLM Refiner sampling mode used for this job (creative | deterministic)';
+
+-- =====================================================
+-- Verification
+-- =====================================================
+
+SELECT column_name, data_type, is_nullable, column_default
+FROM information_schema.columns
+WHERE table_name = 'studio_jobs'
+  AND column_name = 'refinement_mode';
+
+-- Expected: text, NOT NULL, default 'creative'
+-- Existing jobs are backfilled with 'creative' (the previous behaviour)
+-- =====================================================
@@ -1,79 +1,198 @@
-import spacy
-import re
+import os
+import time
+from typing import Dict, List, Optional
 from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from gazetteer import BUCKETS, Gazetteer
+from ner_pipeline import LatencyStats, bucket_entities, load_ner, split_paragraphs
+from result_cache import ENRICH_CACHE_ENABLED, ResultCache, result_key
+from rule_engine import RuleEngine
 
-# 1. Load spacy model for Named Entity Recognition (NER)
-try:
-    nlp = spacy.load("en_core_web_sm")
-except:
-    print("WARNING: spaCy model not found. Running simple entity extraction.")
-    nlp = None
+# 1. Load spacy model for Named Entity Recognition (NER), NER components only
+# (SPACY_MODEL / SPACY_EXCLUDE). STATISTICAL_NER=false runs on the gazetteer alone.
+STATISTICAL_NER = os.environ.get("STATISTICAL_NER", "true").lower() == "true"
+if STATISTICAL_NER:
+    nlp, ner_report = load_ner()
+else:
+    nlp, ner_report = None, {"loaded": False, "disabled": True}
+ner_latency = LatencyStats()
+
+# Known horses, trainers, jockeys and courses (GAZETTEER_PATH), matched on tokens
+gazetteer = Gazetteer(nlp)
+print(f"Loaded racing gazetteer: {gazetteer.stats()}")
 
 app = FastAPI()
 
+# nlp.pipe settings for /enrich/batch (ENRICH_N_PROCESS=0 uses every core)
+ENRICH_BATCH_SIZE = int(os.environ.get("ENRICH_BATCH_SIZE", "64"))
+ENRICH_N_PROCESS = int(os.environ.get("ENRICH_N_PROCESS", "1"))
+# Upper bound on spaCy worker processes, whatever a request asks for (0 = number of cores)
+ENRICH_MAX_PROCESSES = int(os.environ.get("ENRICH_MAX_PROCESSES", "0")) or (os.cpu_count() or 1)
+# Workers for the paragraph chunks of one long transcript on /enrich. 1 = in-process nlp.pipe;
+# above 1 every call forks its own workers and reloads the model, which costs more than the NER
+# on all but very long transcripts (0 = every core)
+NER_CHUNK_PROCESSES = int(os.environ.get("NER_CHUNK_PROCESSES", "1"))
+
+# Repeats of an already-enriched transcript are served from memory
+result_cache = ResultCache() if ENRICH_CACHE_ENABLED else None
+
 # Data Contract for the incoming transcript (from Transcriber)
 class RawTranscript(BaseModel):
     asset_id: str
     transcript: str
+    # Names the scraper captured for this job, matched alongside the gazetteer
+    horse_name: Optional[str] = None
+    trainer_name: Optional[str] = None
+    # Any other per-job names, keyed by gazetteer category (horses/trainers/jockeys/courses)
+    known_entities: Optional[Dict[str, List[str]]] = None
+    cache_bypass: bool = False
+
+    def job_entities(self) -> Dict[str, List[str]]:
+        entities = {key: list(names) for key, names in (self.known_entities or {}).items()}
+        if self.horse_name:
+            entities.setdefault("horses", []).append(self.horse_name)
+        if self.trainer_name:
+            entities.setdefault("trainers", []).append(self.trainer_name)
+        return entities
 
 # Data Contract for the outgoing refined pack (to Refiner)
 class EnrichmentOutput(BaseModel):
     asset_id: str
     clean_text: str
     entities: dict
+    # Every entity with its label and character offsets into the transcript
+    entity_spans: List[dict] = []
+    # Brand rules that rewrote the text, with how often each fired
+    rules_fired: Dict[str, int] = {}
+    cached: bool = False
+
+# Many transcripts in one call, e.g. a backfill of historical jobs
+class BatchTranscripts(BaseModel):
+    items: List[RawTranscript]
+    batch_size: Optional[int] = None
+    n_process: Optional[int] = None
 
 # 2. Brand Compliance Rules (Derived from Brand Bible)
-JARGON_MAPPING = {
-    # Replace Jargon with professional, "Understated Authority" terms
-    r'\bjuice\b': 'fuel',
-    r'\bfurlong\b': 'stretch',
-    r'\breckons\b': 'believes',
-    r'\bgame-changer\b': 'significant breakthrough',
-}
-BANNED_PHRASES = [
-    "disrupting the industry",
-    "revolutionary", 
-    "game-changing", 
-    "cutting-edge tech", 
-    "democratising ownership"
-]  # Source: Brand Bible, Banned/Avoided Language
-
-def clean_and_tag(text: str) -> EnrichmentOutput:
-    # 2a. Simple Jargon Stripping via Regex
-    clean_text = text
-    for jargon, replacement in JARGON_MAPPING.items():
-        clean_text = re.sub(jargon, replacement, clean_text, flags=re.IGNORECASE)
-
-    # 2b. Remove Banned Hype Phrases entirely (Brand Compliance Guardrail)
-    for phrase in BANNED_PHRASES:
-        clean_text = re.sub(phrase, '', clean_text, flags=re.IGNORECASE).strip()
-    
-    # 2c. Entity Recognition (M-V-P implementation)
-    extracted_entities = {}
-    if nlp:
-        doc = nlp(text)
-        # Identify PEOPLE and ORG entities as placeholders for Trainer/Owner names
-        extracted_entities['people'] = [ent.text for ent in doc.ents if ent.label_ == "PERSON"]
-        extracted_entities['orgs'] = [ent.text for ent in doc.ents if ent.label_ == "ORG"]
-        # Basic date extraction
-        extracted_entities['dates'] = [ent.text for ent in doc.ents if ent.label_ == "DATE"]
+# Jargon replacements and banned hype phrases live in rules.json (RULES_PATH),
+# compiled once into a single pattern and hot-reloaded when the file changes
+rules = RuleEngine()
+print(f"Loaded brand rules: {rules.stats()}")
+
+def resolve_n_process(requested: Optional[int]) -> int:
+    n_process = ENRICH_N_PROCESS if requested is None else requested
+    if n_process <= 0:
+        n_process = os.cpu_count() or 1
+    # n_process on /enrich/batch comes from the client; never fork more than the server allows
+    return min(n_process, ENRICH_MAX_PROCESSES)
+
+def cache_fingerprint() -> str:
+    # Anything that changes the output for the same text; a rules reload invalidates old entries.
+    # Check for a rules edit here: cache hits never reach rules.apply(), which is the other reload point.
+    rules.maybe_reload()
+    return f"{ner_report.get('model')}|{rules.compiled.loaded_at}|{gazetteer.stats()}"
+
+def build_output(item: RawTranscript, parts: list) -> EnrichmentOutput:
+    """parts: [(doc, character offset)] for each paragraph chunk of the transcript."""
+    # 2a/2b. Jargon replacement and banned-phrase removal in one pass
+    clean_text, rules_fired = rules.apply(item.transcript)
+
+    # 2c. Entity Recognition: gazetteer names first, then PERSON / ORG / DATE, in one pass
+    job_entities = item.job_entities()
+    matched = [(doc, offset, gazetteer.match(doc, job_entities)) for doc, offset in parts]
+    entities, entity_spans = bucket_entities(matched, BUCKETS)
 
     return EnrichmentOutput(
-        asset_id="simulated-id-123",
-        clean_text=clean_text,
-        entities=extracted_entities
+        asset_id=item.asset_id,
+        clean_text=clean_text.strip(),
+        entities=entities,
+        entity_spans=entity_spans,
+        rules_fired=rules_fired
     )
 
+def parse_items(items: List[RawTranscript], batch_size: int, n_process: int):
+    """
+    Yield (item, [(doc, offset)]) in input order. Long transcripts are split into
+    paragraph chunks; all chunks go through one nlp.pipe across n_process workers.
+    """
+    plans = [split_paragraphs(item.transcript) for item in items]
+    if not nlp:
+        for item, plan in zip(items, plans):
+            yield item, [(gazetteer.make_doc(text), offset) for offset, text in plan]
+        return
+    docs = nlp.pipe(
+        ((text, offset) for plan in plans for offset, text in plan),
+        as_tuples=True,
+        batch_size=batch_size,
+        n_process=n_process,
+    )
+    for item, plan in zip(items, plans):
+        # Time spent waiting on the pipe is NER time (amortised over each batch)
+        started = time.perf_counter()
+        parts = [next(docs) for _ in plan]
+        ner_latency.record(time.perf_counter() - started)
+        yield item, parts
+
+def enrich_many(items: List[RawTranscript], batch_size: int, n_process: int):
+    """Yield outputs in input order; cached results skip rewriting and NER entirely."""
+    fingerprint = cache_fingerprint()
+    keys = [result_key(item.transcript, item.job_entities(), fingerprint) for item in items]
+    cached = [
+        result_cache.get(key) if result_cache and not item.cache_bypass else None
+        for item, key in zip(items, keys)
+    ]
+    misses = [item for item, hit in zip(items, cached) if hit is None]
+    parsed = parse_items(misses, batch_size, n_process)
+
+    for item, key, hit in zip(items, keys, cached):
+        if hit is not None:
+            yield EnrichmentOutput(**{**hit, "asset_id": item.asset_id, "cached": True})
+            continue
+        _, parts = next(parsed)
+        result = build_output(item, parts)
+        if result_cache:
+            result_cache.put(key, result.model_dump(exclude={"asset_id", "cached"}))
+        yield result
+
+def clean_and_tag(item: RawTranscript) -> EnrichmentOutput:
+    # Chunks are parsed in-process unless NER_CHUNK_PROCESSES asks for workers
+    chunks = len(split_paragraphs(item.transcript))
+    n_process = min(chunks, resolve_n_process(NER_CHUNK_PROCESSES))
+    return next(enrich_many([item], ENRICH_BATCH_SIZE, n_process))
+
 # 3. API Endpoint
 @app.post("/enrich", response_model=EnrichmentOutput)
 def enrich_transcript(raw_data: RawTranscript):
     """
     Takes raw transcript, performs jargon stripping and NER, and returns clean, structured data.
     """
-    result = clean_and_tag(raw_data.transcript)
+    result = clean_and_tag(raw_data)
     return result
 
+@app.post("/enrich/batch")
+def enrich_batch(batch: BatchTranscripts):
+    """
+    Enriches many transcripts with nlp.pipe and streams one JSON result per line
+    (NDJSON) in input order, as soon as each one is ready.
+    """
+    batch_size = batch.batch_size or ENRICH_BATCH_SIZE
+    n_process = min(resolve_n_process(batch.n_process), max(1, len(batch.items)))
+
+    def body():
+        for result in enrich_many(batch.items, batch_size, n_process):
+            yield result.model_dump_json() + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "service": "enrich-svc", "compute": "cpu"}
+    return {
+        "status": "ok",
+        "service": "enrich-svc",
+        "compute": "cpu",
+        "rules": rules.stats(),
+        "ner": {**ner_report, "latency": ner_latency.stats()},
+        "gazetteer": gazetteer.stats(),
+        "cache": result_cache.stats() if result_cache else {"enabled": False},
+        "batch": {"batch_size": ENRICH_BATCH_SIZE, "n_process": resolve_n_process(None)}
+    }
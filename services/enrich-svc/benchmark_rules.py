@@ -0,0 +1,78 @@
+"""
+Micro-benchmark: compiled single-pass rule engine vs the previous
+per-rule re.sub loop in clean_and_tag.
+
+The legacy implementation is reproduced here verbatim from the rules in
+rules.json (jargon as \\b-anchored regexes, banned phrases as unescaped
+regexes, one re.sub per rule). The rule set is also padded with synthetic
+rules to show how each approach scales with rule count.
+
+Usage:
+    python3 benchmark_rules.py
+    python3 benchmark_rules.py --words 20000 --extra-rules 500 --repeat 20
+"""
+import argparse
+import json
+import random
+import re
+import timeit
+
+from rule_engine import RULES_PATH, CompiledRules
+
+SAMPLE_WORDS = (
+    "the filly reckons she has the juice for another furlong and the trainer says this "
+    "is a game-changer for the yard not some revolutionary or game-changing idea but steady "
+    "work on the gallops every morning with the lads at the stables"
+).split()
+
+
+def legacy_clean(text: str, jargon_mapping: dict, banned_phrases: list) -> str:
+    clean_text = text
+    for jargon, replacement in jargon_mapping.items():
+        clean_text = re.sub(jargon, replacement, clean_text, flags=re.IGNORECASE)
+    for phrase in banned_phrases:
+        clean_text = re.sub(phrase, '', clean_text, flags=re.IGNORECASE).strip()
+    return clean_text
+
+
+def synthetic_transcript(words: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    return " ".join(rng.choice(SAMPLE_WORDS) for _ in range(words))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark brand rule rewriting")
+    parser.add_argument("--words", type=int, default=5000, help="Transcript length in words")
+    parser.add_argument("--extra-rules", type=int, default=0, help="Synthetic rules added to each set")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with open(RULES_PATH, encoding="utf-8") as f:
+        data = json.load(f)
+    for i in range(args.extra_rules):
+        data["replace"][f"jargonword{i}"] = f"plainword{i}"
+        data["remove"].append(f"hype phrase {i}")
+
+    jargon_mapping = {rf"\b{phrase}\b": replacement for phrase, replacement in data["replace"].items()}
+    banned_phrases = list(data["remove"])
+    compiled = CompiledRules.from_dict(data, RULES_PATH)
+    text = synthetic_transcript(args.words)
+
+    legacy = min(timeit.repeat(
+        lambda: legacy_clean(text, jargon_mapping, banned_phrases), number=1, repeat=args.repeat
+    ))
+    # Compilation happens once at startup in the service; time it separately
+    compile_seconds = min(timeit.repeat(lambda: CompiledRules.from_dict(data, RULES_PATH), number=1, repeat=3))
+    engine = min(timeit.repeat(lambda: compiled.apply(text), number=1, repeat=args.repeat))
+
+    rule_count = len(data["replace"]) + len(data["remove"])
+    print(f"{args.words} words, {rule_count} rules, best of {args.repeat}")
+    print(f"  legacy per-rule re.sub : {legacy * 1000:9.3f} ms")
+    print(f"  compiled single pass   : {engine * 1000:9.3f} ms  ({legacy / engine:.1f}x)")
+    print(f"  one-off compile        : {compile_seconds * 1000:9.3f} ms")
+    _, fired = compiled.apply(text)
+    print(f"  rules fired            : {json.dumps(fired, sort_keys=True)}")
+
+
+if __name__ == "__main__":
+    main()
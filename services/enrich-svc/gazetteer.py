@@ -0,0 +1,84 @@
+"""
+Racing gazetteer for enrich-svc.
+
+Horse names are our most important entity, and the statistical NER either
+misses them or labels them PERSON/ORG. Known horses, trainers, jockeys and
+racecourses are loaded from GAZETTEER_PATH into a spaCy PhraseMatcher
+(case-insensitive, on the LOWER attribute). Lookup is a hash per token no
+matter how many names are loaded, and needs only the tokenizer, so it also
+runs when the statistical model is disabled. Names the scraper captured for
+a job (horse_name, trainer_name) are matched alongside the shared list.
+
+Gazetteer file format (JSON):
+    {"horses": ["Frankel"], "trainers": [], "jockeys": [], "courses": ["Newmarket"]}
+"""
+import json
+import os
+from typing import Dict, Iterable, List, Optional
+
+import spacy
+from spacy.matcher import PhraseMatcher
+from spacy.tokens import Doc, Span
+from spacy.util import filter_spans
+
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "gazetteer.json")
+)
+
+# Gazetteer file key -> match label; buckets in the output use the file keys
+CATEGORIES = {
+    "horses": "HORSE",
+    "trainers": "TRAINER",
+    "jockeys": "JOCKEY",
+    "courses": "COURSE",
+}
+BUCKETS = {label: key for key, label in CATEGORIES.items()}
+
+# Placeholders the scraper falls back to; never worth matching
+_UNKNOWN_NAMES = {"unknown horse", "unknown trainer"}
+
+
+class Gazetteer:
+    def __init__(self, nlp=None, path: str = GAZETTEER_PATH):
+        # Share the statistical pipeline's vocab so its docs can be matched directly
+        self.nlp = nlp or spacy.blank("en")
+        self.path = path
+        self.counts = {key: 0 for key in CATEGORIES}
+        self.matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            for key, label in CATEGORIES.items():
+                names = _clean(data.get(key, []))
+                if names:
+                    self.matcher.add(label, [self.nlp.make_doc(name) for name in names])
+                self.counts[key] = len(names)
+        else:
+            print(f"WARNING: gazetteer not found at {path}; only per-job names will be matched")
+
+    def make_doc(self, text: str) -> Doc:
+        """Tokenize only; used when the statistical model is not loaded."""
+        return self.nlp.make_doc(text)
+
+    def match(self, doc: Doc, job_entities: Optional[Dict[str, List[str]]] = None) -> List[Span]:
+        """Known-entity spans, longest match first where they overlap."""
+        spans = self.matcher(doc, as_spans=True)
+        if job_entities:
+            job_matcher = PhraseMatcher(self.nlp.vocab, attr="LOWER")
+            for key, names in job_entities.items():
+                names = _clean(names) if key in CATEGORIES else []
+                if names:
+                    job_matcher.add(CATEGORIES[key], [self.nlp.make_doc(name) for name in names])
+            if len(job_matcher):
+                spans += job_matcher(doc, as_spans=True)
+        return filter_spans(spans)
+
+    def stats(self) -> dict:
+        return {"path": self.path, "names": self.counts}
+
+
+def _clean(names: Iterable[str]) -> List[str]:
+    return [
+        name.strip() for name in names
+        if name and name.strip() and name.strip().lower() not in _UNKNOWN_NAMES
+    ]
@@ -0,0 +1,143 @@
+"""
+NER-only spaCy pipeline for enrich-svc.
+
+We only read doc.ents, so the tagger, parser, lemmatizer and attribute
+ruler are excluded at load time. They are never deserialised and never
+run per document. The trained English pipelines give NER its own internal
+tok2vec, so the shared tok2vec is excluded as well. If a configured model's
+NER does listen to the shared tok2vec, loading falls back to keeping it.
+"""
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Tuple
+
+import spacy
+
+SPACY_MODEL = os.environ.get("SPACY_MODEL", "en_core_web_sm")
+SPACY_EXCLUDE = [
+    name.strip()
+    for name in os.environ.get("SPACY_EXCLUDE", "tok2vec,tagger,parser,attribute_ruler,lemmatizer,senter").split(",")
+    if name.strip()
+]
+
+# Longer texts are split at paragraph breaks and parsed as separate docs,
+# keeping memory bounded and well under nlp.max_length
+NER_CHUNK_CHARS = int(os.environ.get("NER_CHUNK_CHARS", "10000"))
+
+# spaCy label -> output bucket
+ENTITY_BUCKETS = {
+    "PERSON": "people",  # Placeholders for Trainer/Owner names
+    "ORG": "orgs",
+    "DATE": "dates",
+}
+
+
+def load_ner(model_name: str = SPACY_MODEL, exclude: List[str] = SPACY_EXCLUDE) -> Tuple[Optional[object], dict]:
+    """Returns (nlp or None, load report)."""
+    started = time.monotonic()
+    try:
+        nlp = spacy.load(model_name, exclude=exclude)
+        try:
+            nlp("Warm-up sentence from the yard at Newmarket.")
+        except Exception as e:
+            # NER listens to a shared component we excluded; keep tok2vec and retry
+            print(f"WARNING: {model_name} NER needs an excluded component ({e}); reloading with tok2vec")
+            exclude = [name for name in exclude if name != "tok2vec"]
+            nlp = spacy.load(model_name, exclude=exclude)
+            nlp("Warm-up sentence from the yard at Newmarket.")
+    except Exception as e:
+        print(f"WARNING: spaCy model {model_name} could not be loaded ({e}). Running without entity extraction.")
+        return None, {"model": model_name, "loaded": False}
+
+    report = {
+        "model": model_name,
+        "loaded": True,
+        "components": nlp.pipe_names,
+        "excluded": exclude,
+        "load_seconds": round(time.monotonic() - started, 3),
+    }
+    print(f"Loaded spaCy {model_name} in {report['load_seconds']}s with components {report['components']}")
+    return nlp, report
+
+
+def split_paragraphs(text: str, max_chars: int = NER_CHUNK_CHARS) -> List[Tuple[int, str]]:
+    """
+    Split text into (character offset, chunk) pieces of at most max_chars,
+    cutting at paragraph breaks where possible, else at whitespace.
+    """
+    if len(text) <= max_chars:
+        return [(0, text)]
+    breaks = [m.end() for m in re.finditer(r"\n\s*\n", text)]
+    chunks = []
+    start = 0
+    while len(text) - start > max_chars:
+        limit = start + max_chars
+        cut = max((b for b in breaks if start < b <= limit), default=None)
+        if cut is None:
+            space = text.rfind(" ", start + 1, limit)
+            cut = space + 1 if space > start else limit
+        chunks.append((start, text[start:cut]))
+        start = cut
+    chunks.append((start, text[start:]))
+    return chunks
+
+
+def bucket_entities(parts: List[Tuple[object, int, List]], known_buckets: dict) -> Tuple[dict, List[dict]]:
+    """
+    Group entities from every chunk into output buckets in a single pass over
+    each doc.ents, and list them as spans with offsets into the full text.
+    parts is [(doc, character offset of the chunk, gazetteer spans)].
+    Gazetteer matches take precedence: statistical entities overlapping a known
+    name are dropped, so a horse is not also reported as a PERSON or ORG.
+    """
+    buckets = {bucket: [] for bucket in ENTITY_BUCKETS.values()}
+    spans = []
+    for doc, offset, known_spans in parts:
+        claimed = set()
+        found = []
+        for span in known_spans:
+            found.append((span, known_buckets[span.label_]))
+            claimed.update(range(span.start, span.end))
+        for ent in doc.ents:
+            bucket = ENTITY_BUCKETS.get(ent.label_)
+            if bucket and not claimed.intersection(range(ent.start, ent.end)):
+                found.append((ent, bucket))
+        for span, bucket in sorted(found, key=lambda pair: pair[0].start_char):
+            buckets.setdefault(bucket, []).append(span.text)
+            spans.append({
+                "text": span.text,
+                "label": span.label_,
+                "start": offset + span.start_char,
+                "end": offset + span.end_char,
+            })
+    return buckets, spans
+
+
+class LatencyStats:
+    """Rolling per-document NER latency."""
+
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=window)
+        self.docs = 0
+        self.total_seconds = 0.0
+
+    def record(self, seconds: float, docs: int = 1):
+        per_doc = seconds / docs
+        with self._lock:
+            self.docs += docs
+            self.total_seconds += seconds
+            self._recent.extend([per_doc] * min(docs, self._recent.maxlen))
+
+    def stats(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent)
+            return {
+                "docs": self.docs,
+                "avg_ms": round(self.total_seconds / self.docs * 1000, 2) if self.docs else 0.0,
+                "p50_ms": round(recent[len(recent) // 2] * 1000, 2) if recent else 0.0,
+                "p95_ms": round(recent[int(len(recent) * 0.95)] * 1000, 2) if recent else 0.0,
+            }
@@ -0,0 +1,75 @@
+"""
+In-memory enrichment result cache for enrich-svc.
+
+Results are keyed by a SHA-256 of the transcript, the per-job names and a
+fingerprint of the active rules / model / gazetteer, so a rules reload
+naturally invalidates old entries. Memory is bounded by the approximate
+serialised size of the entries; least recently used entries go first.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+ENRICH_CACHE_ENABLED = os.environ.get("ENRICH_CACHE_ENABLED", "true").lower() == "true"
+ENRICH_CACHE_MAX_BYTES = int(os.environ.get("ENRICH_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+
+def result_key(text: str, job_entities: dict, fingerprint: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(fingerprint.encode())
+    digest.update(b"\0")
+    digest.update(json.dumps(job_entities, sort_keys=True).encode())
+    digest.update(b"\0")
+    digest.update(text.encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = ENRICH_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return json.loads(entry[0])
+
+    def put(self, key: str, value: dict):
+        # Stored serialised: the size is exact and callers cannot mutate cached results
+        payload = json.dumps(value)
+        size = len(payload) + len(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (payload, size)
+            self.bytes += size
+            while self.bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": len(self._entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
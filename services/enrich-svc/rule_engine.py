@@ -0,0 +1,172 @@
+"""
+Brand compliance rule engine for enrich-svc.
+
+Jargon replacements and banned phrases live in an external rules file
+(RULES_PATH) and are compiled once into a single case-insensitive
+pattern, factored as a trie so shared prefixes are matched once. A
+transcript is rewritten in one left-to-right pass no matter how many rules
+there are. Phrases are matched literally (escaped) on word boundaries; the
+longest phrase wins where two overlap. The file is re-read when it changes,
+and an invalid edit keeps the previous rules.
+
+Rules file format (JSON):
+    {
+      "replace": {"juice": "fuel", "reckons": "believes"},
+      "remove": ["revolutionary", "game-changing"]
+    }
+"""
+import json
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+RULES_PATH = os.environ.get("RULES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.json"))
+# Seconds between checks of the rules file's modification time (0 = check on every call)
+RULES_RELOAD_INTERVAL = float(os.environ.get("RULES_RELOAD_INTERVAL", "5"))
+
+REPLACE = "replace"
+REMOVE = "remove"
+
+
+@dataclass(frozen=True)
+class Rule:
+    phrase: str
+    action: str
+    replacement: str = ""
+
+
+def _normalise(phrase: str) -> str:
+    return " ".join(phrase.lower().split())
+
+
+def _trie_pattern(phrases: List[str]) -> str:
+    """
+    Regex for a set of literal phrases, factored as a trie so shared prefixes
+    are matched once ("game-change(?:r|ing)") instead of trying every phrase
+    at every position. Spaces match any run of whitespace.
+    """
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [
+            (r"\s+" if char == " " else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ""
+        optional = "" in node
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        # Greedy: the longer phrase is tried first where one is a prefix of another
+        return f"(?:{'|'.join(branches)}){'?' if optional else ''}"
+
+    return emit(trie)
+
+
+def _match_case(matched: str, replacement: str) -> str:
+    if matched.isupper() and len(matched) > 1:
+        return replacement.upper()
+    if matched[:1].isupper():
+        return replacement[:1].upper() + replacement[1:]
+    return replacement
+
+
+class CompiledRules:
+    """An immutable compiled rule set; swapped atomically on reload."""
+
+    def __init__(self, rules: List[Rule], source: str, mtime: Optional[float] = None):
+        self.rules = {_normalise(rule.phrase): rule for rule in rules}
+        self.source = source
+        self.mtime = mtime
+        self.loaded_at = time.time()
+        body = _trie_pattern(list(self.rules))
+        self.pattern = re.compile(rf"(?<!\w){body}(?!\w)", re.IGNORECASE) if body else None
+
+    @classmethod
+    def from_dict(cls, data: dict, source: str, mtime: Optional[float] = None) -> "CompiledRules":
+        rules = [Rule(phrase, REPLACE, replacement) for phrase, replacement in data.get(REPLACE, {}).items()]
+        rules += [Rule(phrase, REMOVE) for phrase in data.get(REMOVE, [])]
+        for rule in rules:
+            if not rule.phrase.strip():
+                raise ValueError("Rules must not contain empty phrases")
+        return cls(rules, source, mtime)
+
+    def apply(self, text: str) -> Tuple[str, Dict[str, int]]:
+        """Rewrite text in a single pass. Returns (clean text, fired rule counts keyed by phrase)."""
+        fired: Dict[str, int] = {}
+        if self.pattern is None:
+            return text, fired
+
+        def substitute(match: re.Match) -> str:
+            rule = self.rules[_normalise(match.group(0))]
+            fired[rule.phrase] = fired.get(rule.phrase, 0) + 1
+            if rule.action == REMOVE:
+                return ""
+            return _match_case(match.group(0), rule.replacement)
+
+        return self.pattern.sub(substitute, text), fired
+
+    def describe(self) -> dict:
+        return {
+            "source": self.source,
+            "loaded_at": self.loaded_at,
+            "replace": sum(1 for rule in self.rules.values() if rule.action == REPLACE),
+            "remove": sum(1 for rule in self.rules.values() if rule.action == REMOVE),
+        }
+
+
+class RuleEngine:
+    def __init__(self, path: str = RULES_PATH, reload_interval: float = RULES_RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._checked_at = 0.0
+        self.compiled = self._load()
+        # Last modification time attempted, so a broken file is reported once, not every interval
+        self._seen_mtime = self.compiled.mtime
+
+    def _load(self) -> CompiledRules:
+        mtime = os.path.getmtime(self.path)
+        with open(self.path, encoding="utf-8") as f:
+            return CompiledRules.from_dict(json.load(f), self.path, mtime)
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked_at < self.reload_interval:
+            return
+        # One thread checks; others keep using the current rules
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+                if mtime == self._seen_mtime:
+                    return
+                self._seen_mtime = mtime
+                self.compiled = self._load()
+                self.reloads += 1
+                self.last_error = None
+                print(f"Reloaded brand rules from {self.path}: {self.compiled.describe()}")
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"WARNING: keeping previous brand rules, reload failed: {e}")
+        finally:
+            self._lock.release()
+
+    def apply(self, text: str) -> Tuple[str, Dict[str, int]]:
+        self.maybe_reload()
+        return self.compiled.apply(text)
+
+    def stats(self) -> dict:
+        return {**self.compiled.describe(), "reloads": self.reloads, "last_error": self.last_error}
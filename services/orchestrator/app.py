@@ -1,7 +1,10 @@
+import json
 import os
+import time
 import requests
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from supabase_client import StudioJobsClient
+from lib.brand_prompt import PERSONA_PROMPTS, get_system_prompt, get_system_prompt_id
 
 app = Flask(__name__)
 
@@ -10,6 +13,22 @@ TRANSCRIPTION_URL = os.environ.get("TRANSCRIPTION_URL", "http://transcription:80
 ENRICHMENT_URL = os.environ.get("ENRICHMENT_URL", "http://enrichment:8002")
 REFINER_URL = os.environ.get("REFINER_URL", "http://llm_refiner:8001")
 
+# Transcriber decoding profiles: fast (greedy, English, VAD) or accurate (beam search)
+DECODING_PROFILES = ("fast", "accurate")
+DEFAULT_DECODING_PROFILE = os.environ.get("DEFAULT_DECODING_PROFILE", "accurate")
+
+# Refiner sampling modes: creative (temperature 0.7) or deterministic (greedy, fixed seed, cacheable)
+REFINEMENT_MODES = ("creative", "deterministic")
+DEFAULT_REFINEMENT_MODE = os.environ.get("DEFAULT_REFINEMENT_MODE", "creative")
+
+# Refine paragraph by paragraph on the refiner, reusing cached refinements of unchanged
+# paragraphs (recurring weekly reports repeat most of their text). The refiner applies it
+# to deterministic refinements only; creative ones are refined whole
+INCREMENTAL_REFINEMENT = os.environ.get("INCREMENTAL_REFINEMENT", "false").lower() == "true"
+
+# Seconds between writes of partial refined text to the job while a refinement streams
+REFINE_PROGRESS_INTERVAL = float(os.environ.get("REFINE_PROGRESS_INTERVAL", "2"))
+
 # Initialize Supabase client
 try:
     db = StudioJobsClient()
@@ -55,10 +74,18 @@ def start_new_job():
     supabase_file_id = data.get('supabase_file_id')
     
     system_prompt = data.get('system_prompt', DEFAULT_SYSTEM_PROMPT)
+    decoding_profile = data.get('decoding_profile', DEFAULT_DECODING_PROFILE)
+    refinement_mode = data.get('refinement_mode', DEFAULT_REFINEMENT_MODE)
 
     if not user_id:
         return jsonify({"error": "Missing user_id"}), 400
     
+    if decoding_profile not in DECODING_PROFILES:
+        return jsonify({"error": f"Unknown decoding_profile: {decoding_profile}"}), 400
+    
+    if refinement_mode not in REFINEMENT_MODES:
+        return jsonify({"error": f"Unknown refinement_mode: {refinement_mode}"}), 400
+    
     if not source_url and not supabase_file_id:
         return jsonify({"error": "Missing source_url or supabase_file_id"}), 400
 
@@ -67,6 +94,8 @@ def start_new_job():
 
     print(f"--- Received New Job Request ---")
     print(f"User ID: {user_id}")
+    print(f"Decoding profile: {decoding_profile}")
+    print(f"Refinement mode: {refinement_mode}")
     
     try:
         if source_url:
@@ -78,7 +107,9 @@ def start_new_job():
                 user_id=user_id,
                 source_url=source_url,
                 trainer_logo_url=trainer_logo_url,
-                system_prompt=system_prompt
+                system_prompt=system_prompt,
+                decoding_profile=decoding_profile,
+                refinement_mode=refinement_mode
             )
             
             workflow_type = "mistable"
@@ -91,7 +122,9 @@ def start_new_job():
             job = db.create_job(
                 user_id=user_id,
                 raw_audio_url=f"supabase://storage/{supabase_file_id}",
-                system_prompt=system_prompt
+                system_prompt=system_prompt,
+                decoding_profile=decoding_profile,
+                refinement_mode=refinement_mode
             )
             
             workflow_type = "direct_audio"
@@ -113,6 +146,8 @@ def start_new_job():
             "job_id": job_id,
             "job_status": job['status'],
             "workflow": workflow_type,
+            "decoding_profile": decoding_profile,
+            "refinement_mode": refinement_mode,
             "created_at": job['created_at'],
             "next_step": next_step
         }), 201
@@ -124,6 +159,104 @@ def start_new_job():
             "message": str(e)
         }), 500
 
+def parse_sse(lines):
+    """Yield (raw event block, event dict) from a Server-Sent Events line stream."""
+    block = []
+    for line in lines:
+        if line:
+            block.append(line)
+            continue
+        data = "".join(l[len("data: "):] for l in block if l.startswith("data: "))
+        if data:
+            yield "\n".join(block) + "\n\n", json.loads(data)
+        block = []
+
+@app.route('/v1/refine/stream', methods=['POST'])
+def stream_refinement():
+    """
+    Relays a streamed refinement from the LLM Refiner as Server-Sent Events.
+    With a job_id, partial text is saved on the job every REFINE_PROGRESS_INTERVAL
+    seconds while status is REFINING, and the final text completes the job.
+    """
+    data = request.json
+    raw_text = data.get('raw_text')
+    job_id = data.get('job_id')
+    persona = data.get('persona')
+    chunk = data.get('chunk', 'sentence')
+    refinement_mode = data.get('refinement_mode')
+    incremental = data.get('incremental', INCREMENTAL_REFINEMENT)
+
+    if not raw_text:
+        return jsonify({"error": "Missing raw_text"}), 400
+    
+    if persona and persona.lower() not in PERSONA_PROMPTS:
+        return jsonify({"error": f"Unknown persona: {persona}"}), 400
+    
+    if job_id and not db:
+        return jsonify({"error": "Supabase client not initialized"}), 500
+    
+    if job_id and not refinement_mode:
+        # Reprocessing a job uses the mode stored on it, so deterministic jobs reproduce
+        job = db.get_job(job_id)
+        refinement_mode = job.get('refinement_mode') if job else None
+    refinement_mode = refinement_mode or DEFAULT_REFINEMENT_MODE
+    
+    if refinement_mode not in REFINEMENT_MODES:
+        return jsonify({"error": f"Unknown refinement_mode: {refinement_mode}"}), 400
+
+    if persona:
+        payload = {"system_prompt": get_system_prompt(persona), "prompt_id": get_system_prompt_id(persona)}
+    else:
+        payload = {"system_prompt": data.get('system_prompt', DEFAULT_SYSTEM_PROMPT)}
+    payload["raw_text"] = raw_text
+    payload["mode"] = refinement_mode
+    payload["incremental"] = bool(incremental)
+    if data.get('model'):
+        # GGUF on the refiner (GET /models); otherwise the refiner's current default
+        payload["model"] = data['model']
+
+    upstream = requests.post(
+        f"{REFINER_URL}/refine_text/stream",
+        params={"format": "sse", "chunk": chunk},
+        json=payload,
+        stream=True,
+        timeout=(5, 300)
+    )
+    if upstream.status_code != 200:
+        # A full refiner queue answers 429 with Retry-After; pass it on so clients back off
+        headers = {"Retry-After": upstream.headers["Retry-After"]} if "Retry-After" in upstream.headers else {}
+        details = upstream.text
+        upstream.close()
+        return jsonify({"error": "Refiner rejected the request", "details": details}), upstream.status_code, headers
+
+    if job_id:
+        db.update_status(job_id, db.STATUS_REFINING)
+
+    def relay():
+        pieces = []
+        saved_at = time.monotonic()
+        try:
+            for raw, event in parse_sse(upstream.iter_lines(decode_unicode=True)):
+                yield raw
+                if not job_id:
+                    continue
+                if event["type"] in ("token", "sentence"):
+                    pieces.append(event["text"])
+                    if time.monotonic() - saved_at >= REFINE_PROGRESS_INTERVAL:
+                        db.store_refinement_progress(job_id, "".join(pieces))
+                        saved_at = time.monotonic()
+                elif event["type"] == "done":
+                    db.store_refined_text(job_id, event["refined_text"])
+                    print(f"✓ Refinement complete for job {job_id}: {event['usage']}")
+                    if event.get("paragraphs"):
+                        print(f"  Paragraphs: {event['paragraphs']}")
+                elif event["type"] == "error":
+                    db.update_status(job_id, db.STATUS_FAILED, {"stage": "refinement", "message": event["message"]})
+        finally:
+            upstream.close()
+
+    return Response(stream_with_context(relay()), mimetype="text/event-stream")
+
 @app.route('/health', methods=['GET'])
 def health_check():
     return jsonify({"status": "ok", "service": "orchestrator", "compute": "cpu"})
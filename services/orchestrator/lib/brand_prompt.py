@@ -7,7 +7,12 @@ Persona-specific instructions are appended after this block.
 The Core Brand Prompt ensures that regardless of the selected persona (Liam, James, 
 Clara, or Ethan), the fundamental promise of Understated Authority and Clarity 
 is maintained across all content.
+
+Each persona prompt also has a stable identity (get_system_prompt_id) derived
+from its text. The LLM Refiner caches the evaluated prompt prefix per identity,
+so the id changes whenever the wording does and a stale cache is never reused.
 """
+import hashlib
 
 CORE_BRAND_PROMPT = """
 You are the Evolution Stables Language Enhancement Layer (L.E.L.). Your primary role is to act as a bridge between racing heritage and digital precision, delivering content that is definitive and authoritative.
@@ -167,5 +172,28 @@ def get_system_prompt(persona: str = "james") -> str:
     return f"{CORE_BRAND_PROMPT}\n\n{PERSONA_PROMPTS[persona]}"
 
 
+def get_system_prompt_id(persona: str = "james") -> str:
+    """
+    Stable identity of the complete system prompt for a persona.
+    
+    Args:
+        persona: One of 'liam', 'james', 'clara', 'ethan'
+        
+    Returns:
+        '<persona>-<first 12 hex chars of the prompt's SHA-256>', e.g. 'james-3f9a0c1b2d4e'
+    """
+    persona = persona.lower()
+    
+    if persona not in PERSONA_PROMPTS:
+        persona = "james"
+    
+    digest = hashlib.sha256(get_system_prompt(persona).encode("utf-8")).hexdigest()
+    return f"{persona}-{digest[:12]}"
+
+
+# Persona -> prompt identity, computed once at import
+PERSONA_PROMPT_IDS = {persona: get_system_prompt_id(persona) for persona in PERSONA_PROMPTS}
+
+
 # Exported for use by pipeline.py and other services
-__all__ = ['CORE_BRAND_PROMPT', 'PERSONA_PROMPTS', 'get_system_prompt']
+__all__ = ['CORE_BRAND_PROMPT', 'PERSONA_PROMPTS', 'PERSONA_PROMPT_IDS', 'get_system_prompt', 'get_system_prompt_id']
@@ -48,7 +48,9 @@ class StudioJobsClient:
         source_url: str = None,
         raw_mp4_path: str = None,
         raw_mp3_path: str = None,
-        trainer_logo_url: str = None
+        trainer_logo_url: str = None,
+        decoding_profile: str = None,
+        refinement_mode: str = None
     ) -> Dict[str, Any]:
         """
         Create a new job in the studio_jobs table
@@ -61,6 +63,8 @@ class StudioJobsClient:
             raw_mp4_path: Path to downloaded MP4 video in Supabase Storage
             raw_mp3_path: Path to extracted MP3 audio for transcription
             trainer_logo_url: URL to trainer logo from Brand Kit
+            decoding_profile: Transcriber decoding profile (fast | accurate)
+            refinement_mode: LLM Refiner sampling mode (creative | deterministic)
         
         Returns:
             Dict containing the created job record
@@ -83,6 +87,10 @@ class StudioJobsClient:
             job_data["raw_mp3_path"] = raw_mp3_path
         if trainer_logo_url:
             job_data["trainer_logo_url"] = trainer_logo_url
+        if decoding_profile:
+            job_data["decoding_profile"] = decoding_profile
+        if refinement_mode:
+            job_data["refinement_mode"] = refinement_mode
         
         response = self.client.table("studio_jobs").insert(job_data).execute()
         return response.data[0]
@@ -115,7 +123,8 @@ class StudioJobsClient:
     def store_transcript(
         self,
         job_id: str,
-        transcript: str
+        transcript: str,
+        decoding_profile: str = None
     ) -> Dict[str, Any]:
         """
         Store raw transcript and update status to ENRICHING
@@ -123,6 +132,7 @@ class StudioJobsClient:
         Args:
             job_id: UUID of the job
             transcript: Raw transcript from Whisper
+            decoding_profile: Profile the Transcriber actually used, if reported
         
         Returns:
             Dict containing the updated job record
@@ -132,6 +142,9 @@ class StudioJobsClient:
             "raw_transcript": transcript
         }
         
+        if decoding_profile:
+            update_data["decoding_profile"] = decoding_profile
+        
         response = self.client.table("studio_jobs").update(update_data).eq("job_id", job_id).execute()
         return response.data[0]
     
@@ -159,6 +172,30 @@ class StudioJobsClient:
         response = self.client.table("studio_jobs").update(update_data).eq("job_id", job_id).execute()
         return response.data[0]
     
+    def store_refinement_progress(
+        self,
+        job_id: str,
+        partial_text: str
+    ) -> Dict[str, Any]:
+        """
+        Store partial refined text while the LLM Refiner is still streaming
+        The job stays REFINING; store_refined_text() writes the final text
+        
+        Args:
+            job_id: UUID of the job
+            partial_text: Refined text generated so far
+        
+        Returns:
+            Dict containing the updated job record
+        """
+        update_data = {
+            "status": self.STATUS_REFINING,
+            "refined_text": partial_text
+        }
+        
+        response = self.client.table("studio_jobs").update(update_data).eq("job_id", job_id).execute()
+        return response.data[0]
+    
     def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
         """
         Retrieve a job by ID
@@ -1,92 +1,645 @@
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 from llama_cpp import Llama
+from incremental import pending, plan_paragraphs, summary
+from inference_queue import InferenceQueue, QueueFullError, TicketCancelled
+from llm_config import LlamaConfig, config_from_env, resolve_model
+from long_document import (
+    CHUNK_SEPARATOR, REFINE_OUTPUT_MARGIN, REFINE_OUTPUT_RATIO, ContextTooSmallError, plan_chunks, stitch
+)
+from model_pool import LLM_REPLICAS, ModelPool
+from model_registry import ModelRegistry, UnknownModelError
+from result_cache import REFINE_CACHE_ENABLED, RefinementCache, cache_key
+from speculative import SPECULATIVE_DECODING, make_draft_model
+from speculative import describe as describe_speculative
+from token_stream import STREAM_CHUNKS, STREAM_MEDIA_TYPES, SentenceChunker, UsageMeter, encode_event
 
-# 1. Configuration 
-MODEL_PATH = os.environ.get("MODEL_PATH", "/app/models/")
-MODEL_NAME = os.environ.get("MODEL_NAME", "mistral-7b-finetune.gguf")
-N_GPU_LAYERS = int(os.environ.get("N_GPU_LAYERS", "-1")) # -1 loads all layers to VRAM
-N_CTX = int(os.environ.get("N_CTX", "4096"))
+# 1. Configuration (GPU offload or the CPU profile, see llm_config.py).
+# The GGUF for MODEL_QUANT is resolved at startup, so a missing model shows on /ready
+LLAMA_CONFIG = config_from_env()
+MODEL_NAME = LLAMA_CONFIG.model_name
+N_CTX = LLAMA_CONFIG.n_ctx
+STARTUP_RETRY_AFTER = int(os.environ.get("STARTUP_RETRY_AFTER", "30"))
 
 app = FastAPI()
-model = None
+# GGUF models (LLM_MODELS), each a pool of LLM_REPLICAS llama.cpp contexts, loaded on first use
+registry = None
+# Every generation runs off the event loop behind a bounded queue (INFERENCE_*)
+inference_queue = InferenceQueue()
+# Chunks of a long document are refined concurrently, one per free replica
+chunk_executor = ThreadPoolExecutor(max_workers=LLM_REPLICAS, thread_name_prefix="refine-chunk")
+
+# Deterministic refinements are served from disk when repeated (REFINE_CACHE_*)
+refinement_cache = None
+
+# Generation settings shared by /refine_text and /refine_text/stream.
+# max_tokens is sized per prompt from its input (long_document.output_budget)
+STOP = ["</s>", "[INST]"]
+REFINE_SEED = int(os.environ.get("REFINE_SEED", "42"))
+# creative: sampled, different on every run. deterministic: greedy with a fixed seed,
+# so a re-run reproduces the same text and can be cached
+REFINEMENT_MODES = {
+    "creative": {"temperature": 0.7, "seed": None},
+    "deterministic": {"temperature": 0.0, "seed": REFINE_SEED},
+}
+DEFAULT_REFINEMENT_MODE = os.environ.get("DEFAULT_REFINEMENT_MODE", "creative")
 
 # Request model for JSON body
 class RefineRequest(BaseModel):
     raw_text: str
     system_prompt: str = None  # Optional override for custom system prompts
+    # Stable identity of system_prompt (orchestrator lib/brand_prompt.get_system_prompt_id), for stats
+    prompt_id: Optional[str] = None
+    # Split transcripts that do not fit N_CTX into paragraph chunks (False = always one prompt)
+    long_document: bool = True
+    # creative | deterministic (see REFINEMENT_MODES); defaults to DEFAULT_REFINEMENT_MODE
+    mode: Optional[str] = None
+    cache_bypass: bool = False
+    # GGUF file in MODEL_PATH (see GET /models); defaults to the current default model
+    model: Optional[str] = None
+    # Refine paragraph by paragraph, reusing cached refinements of unchanged paragraphs (incremental.py).
+    # Deterministic mode only; creative requests are refined whole as usual
+    incremental: bool = False
+
+class DefaultModelRequest(BaseModel):
+    model: str
+
+# Define the comprehensive Brand Bible-aligned system prompt
+DEFAULT_SYSTEM_PROMPT = (
+    "You are the Evolution Stables Language Enhancement Layer (L.E.L.). "
+    "Your sole function is to take raw, unrefined text regarding racehorse training, performance, or asset status "
+    "and transform it into the official Evolution Stables brand voice.\n\n"
+    "**VOICE & TONE:** Understated Authority. You are declarative, confident, and calm. "
+    "You prove innovation; you do not shout hype.\n"
+    "**BRAND ESSENCE:** You are a bridge between the paddock (heritage) and the protocol (innovation).\n"
+    "**CORE PROMISE:** Ownership, evolved. You are the benchmark.\n\n"
+    "**MANDATES:**\n"
+    "1. **Clarity First, Poetry Second**.\n"
+    "2. **Use Active Voice** (e.g., 'We build,' not 'is built').\n"
+    "3. **Replace Hype with Proof** (e.g., 'Regulated' over 'Revolutionary').\n"
+    "4. **Avoid Banned Language** (e.g., 'disrupting,' 'revolutionary,' 'game-changing').\n"
+    "5. **Maintain a Human, Relatable Tone**.\n"
+    "6. **Always use British English** (e.g., 'colour', 'modernise').\n\n"
+    "**REFINEMENT DIRECTIVES:**\n"
+    "- AVOID phrases like 'juice,' 'game-changer,' 'reckons,' and 'massive.' "
+    "Replace with professional equivalents like 'energy,' 'significant breakthrough,' 'believes,' and 'substantial'.\n"
+    "- Replace technical racing jargon (e.g., 'furlong') with clearer, accessible terms "
+    "('stretch,' 'final distance') to promote clarity for investors and fans alike.\n"
+    "- If a call to action is required, use phrases that reflect access and community, "
+    "such as: 'Join the movement,' or 'This is ownership, evolved'.\n\n"
+    "Transform the following text while maintaining these principles."
+)
+DEFAULT_PROMPT_ID = "lel-default"
+
+def prompt_prefix(system_prompt: str) -> str:
+    # Everything before the transcript; identical for every request with this system prompt
+    return f"<s>[INST] {system_prompt}\n\n"
+
+def build_prompt(system_prompt: str, raw_text: str) -> str:
+    # Mistral 7B Instruct format for the prompt
+    return f"{prompt_prefix(system_prompt)}Refine the following text: \"{raw_text}\" [/INST]"
+
+def load_model(config: LlamaConfig = LLAMA_CONFIG, speculative: str = SPECULATIVE_DECODING):
+    # Llama-cpp-python initialization; prompt-lookup drafting when SPECULATIVE_DECODING is on
+    return Llama(
+        **config.llama_kwargs(),
+        draft_model=make_draft_model(speculative),
+        verbose=True
+    )
+
+def warm_prefix(pool: ModelPool):
+    for replica in pool.replicas:
+        if replica.prefix_cache:
+            # The default prompt is the most common prefix; evaluate it before the first request
+            replica.prefix_cache.prepare(prompt_prefix(DEFAULT_SYSTEM_PROMPT), DEFAULT_PROMPT_ID)
+
+# Startup report, served on /ready and /health
+startup = {"state": "starting", "model": None, "seconds": None, "error": None}
 
-@app.on_event("startup")
 def load_llm():
-    global model
+    global registry, refinement_cache
+    started = time.monotonic()
     try:
-        print(f"Loading LLM: {MODEL_NAME} from {MODEL_PATH}...")
-        # Llama-cpp-python initialization
-        model = Llama(
-            model_path=os.path.join(MODEL_PATH, MODEL_NAME),
-            n_gpu_layers=N_GPU_LAYERS,
-            n_ctx=N_CTX,
-            verbose=True
-        )
-        print(f"LLM loaded successfully with {model.n_gpu_layers} layers offloaded to RTX 3060.")
+        config = resolve_model(LLAMA_CONFIG)
+        startup["model"] = config.model_name
+        print(f"Loading LLM: {config.model_name} from {config.model_path} on {config.device} "
+              f"({LLM_REPLICAS} replica(s), speculative decoding: {SPECULATIVE_DECODING})...")
+        loaded = ModelRegistry(config, load_model, on_load=warm_prefix)
+        # Only the default is loaded now; the other LLM_MODELS load on their first request
+        loaded.preload()
+        if LLAMA_CONFIG.device == "cpu":
+            print(f"LLM loaded successfully on CPU ({LLAMA_CONFIG.n_threads} threads, "
+                  f"{LLAMA_CONFIG.n_threads_batch} batch threads per replica).")
+        else:
+            print(f"LLM loaded successfully with {LLAMA_CONFIG.n_gpu_layers} layers offloaded to the GPU.")
+        print(f"Available models: {', '.join(loaded.names)} (budget: {loaded.budget_mb or 'none'} MB)")
+        registry = loaded
+        if REFINE_CACHE_ENABLED:
+            refinement_cache = RefinementCache()
+            print(f"Refinement cache: {refinement_cache.path} ({refinement_cache.stats()['entries']} entries)")
+        startup["state"] = "ready"
     except Exception as e:
+        startup["state"] = "failed"
+        startup["error"] = str(e)
         print(f"FATAL ERROR loading LLM: {e}")
-        # In production, you might want to stop the service here.
+    finally:
+        startup["seconds"] = round(time.monotonic() - started, 2)
 
-# 2. API Endpoint for Text Refinement
-@app.post("/refine_text")
-async def refine_text(request: RefineRequest):
-    if not model:
-        return {"error": "LLM not loaded"}, 500
-
-    # Define the comprehensive Brand Bible-aligned system prompt
-    default_system_prompt = (
-        "You are the Evolution Stables Language Enhancement Layer (L.E.L.). "
-        "Your sole function is to take raw, unrefined text regarding racehorse training, performance, or asset status "
-        "and transform it into the official Evolution Stables brand voice.\n\n"
-        "**VOICE & TONE:** Understated Authority. You are declarative, confident, and calm. "
-        "You prove innovation; you do not shout hype.\n"
-        "**BRAND ESSENCE:** You are a bridge between the paddock (heritage) and the protocol (innovation).\n"
-        "**CORE PROMISE:** Ownership, evolved. You are the benchmark.\n\n"
-        "**MANDATES:**\n"
-        "1. **Clarity First, Poetry Second**.\n"
-        "2. **Use Active Voice** (e.g., 'We build,' not 'is built').\n"
-        "3. **Replace Hype with Proof** (e.g., 'Regulated' over 'Revolutionary').\n"
-        "4. **Avoid Banned Language** (e.g., 'disrupting,' 'revolutionary,' 'game-changing').\n"
-        "5. **Maintain a Human, Relatable Tone**.\n"
-        "6. **Always use British English** (e.g., 'colour', 'modernise').\n\n"
-        "**REFINEMENT DIRECTIVES:**\n"
-        "- AVOID phrases like 'juice,' 'game-changer,' 'reckons,' and 'massive.' "
-        "Replace with professional equivalents like 'energy,' 'significant breakthrough,' 'believes,' and 'substantial'.\n"
-        "- Replace technical racing jargon (e.g., 'furlong') with clearer, accessible terms "
-        "('stretch,' 'final distance') to promote clarity for investors and fans alike.\n"
-        "- If a call to action is required, use phrases that reflect access and community, "
-        "such as: 'Join the movement,' or 'This is ownership, evolved'.\n\n"
-        "Transform the following text while maintaining these principles."
-    )
-    
+@app.on_event("startup")
+def start_model_loading():
+    # Load in the background so /live answers while the model loads; /ready gates traffic
+    threading.Thread(target=load_llm, name="llm-startup", daemon=True).start()
+
+def model_ready() -> bool:
+    return startup["state"] == "ready"
+
+def not_ready_response() -> JSONResponse:
+    if startup["state"] == "failed":
+        return error_response(f"LLM failed to load: {startup['error']}", 503)
+    return error_response("LLM not loaded", 503, retry_after=STARTUP_RETRY_AFTER)
+
+def error_response(message: str, status_code: int = 500, retry_after: Optional[int] = None) -> JSONResponse:
+    content = {"error": message}
+    headers = None
+    if retry_after is not None:
+        content["retry_after"] = retry_after
+        headers = {"Retry-After": str(retry_after)}
+    return JSONResponse(status_code=status_code, content=content, headers=headers)
+
+def resolve_prompt(request: RefineRequest):
     # Use custom system prompt if provided, otherwise use default
-    system_prompt = request.system_prompt if request.system_prompt else default_system_prompt
-    
-    # Mistral 7B Instruct format for the prompt
-    prompt = f"<s>[INST] {system_prompt}\n\nRefine the following text: \"{request.raw_text}\" [/INST]"
-    
-    output = model(
-        prompt,
-        max_tokens=512,
-        stop=["</s>", "[INST]"],
-        temperature=0.7
+    if request.system_prompt:
+        return request.system_prompt, request.prompt_id
+    return DEFAULT_SYSTEM_PROMPT, DEFAULT_PROMPT_ID
+
+def sampling_options(request: RefineRequest) -> dict:
+    return REFINEMENT_MODES[request.mode or DEFAULT_REFINEMENT_MODE]
+
+def validate_request(request: RefineRequest) -> Optional[JSONResponse]:
+    mode = request.mode or DEFAULT_REFINEMENT_MODE
+    if mode not in REFINEMENT_MODES:
+        return error_response(f"Unknown refinement mode: {mode} (known: {', '.join(REFINEMENT_MODES)})", 400)
+    try:
+        # Pin the model now so a default swap while queued cannot change it (or its cache key)
+        request.model = registry.resolve(request.model)
+    except UnknownModelError as e:
+        return error_response(str(e), 400)
+    return None
+
+def cache_options(request: RefineRequest) -> dict:
+    # Every setting besides model, prompt and text that changes the refined output
+    options = {
+        **sampling_options(request),
+        "stop": STOP,
+        "n_ctx": N_CTX,
+        "long_document": request.long_document,
+        "output_ratio": REFINE_OUTPUT_RATIO,
+        "output_margin": REFINE_OUTPUT_MARGIN,
+    }
+    if use_incremental(request):
+        options["incremental"] = True
+    return options
+
+def use_incremental(request: RefineRequest) -> bool:
+    # Like lookup_cache: creative output differs on every run, so its paragraphs are never reused
+    return request.incremental and (request.mode or DEFAULT_REFINEMENT_MODE) == "deterministic"
+
+def lookup_cache(request: RefineRequest):
+    """
+    Returns (key or None, cached result or None). Only deterministic refinements are cached.
+    Blocking (SQLite, and the model hash if its file changed since load); run it off the event loop.
+    """
+    mode = request.mode or DEFAULT_REFINEMENT_MODE
+    if not refinement_cache or mode != "deterministic":
+        return None, None
+    system_prompt, _ = resolve_prompt(request)
+    key = cache_key(registry.fingerprint(request.model), system_prompt, request.raw_text, cache_options(request))
+    if request.cache_bypass:
+        refinement_cache.note_bypass()
+        return key, None
+    return key, refinement_cache.get(key)
+
+def plan_request(pool: ModelPool, request: RefineRequest, text: Optional[str] = None):
+    """
+    Returns (system prompt, prompt id, chunks); a transcript that fits N_CTX is one chunk.
+    text replaces request.raw_text, e.g. a single paragraph in incremental mode.
+    """
+    system_prompt, prompt_id = resolve_prompt(request)
+    replica = pool.any()
+    # Template tokens around the transcript, counted the way llama.cpp will tokenize the prompt
+    overhead = replica.count_tokens(build_prompt(system_prompt, ""), special=True) + 1
+    text = request.raw_text if text is None else text
+    chunks = plan_chunks(text, pool.n_ctx, overhead, replica.count_tokens, split=request.long_document)
+    return system_prompt, prompt_id, chunks
+
+def plan_incremental(request: RefineRequest):
+    """Paragraphs of the transcript, with cached refinements attached (none when cache_bypass is set)."""
+    if not use_incremental(request):
+        raise ValueError("Incremental refinement requires deterministic mode")
+    system_prompt, _ = resolve_prompt(request)
+    cache = refinement_cache if not request.cache_bypass else None
+    return plan_paragraphs(
+        request.raw_text, registry.fingerprint(request.model), system_prompt, cache_options(request), cache
     )
+
+def store_paragraph(request: RefineRequest, key: str, refined_text: str):
+    if refinement_cache and refined_text and use_incremental(request):
+        refinement_cache.put(key, {"refined_text": refined_text})
+
+def prepare_prompt(replica, system_prompt: str, prompt_id: Optional[str], text: str):
+    """Restore the evaluated system prompt; llama.cpp then only evaluates the transcript."""
+    prompt = build_prompt(system_prompt, text)
+    cache = replica.prefix_cache
+    prompt_cache = cache.prepare(prompt_prefix(system_prompt), prompt_id) if cache else None
+    return prompt, prompt_cache
+
+def refine_chunk(pool: ModelPool, system_prompt: str, prompt_id: Optional[str], chunk, sampling: dict) -> dict:
+    with pool.acquire() as replica:
+        prompt, prompt_cache = prepare_prompt(replica, system_prompt, prompt_id, chunk.text)
+        output = replica.model(prompt, max_tokens=chunk.max_tokens, stop=STOP, **sampling)
+    choice = output["choices"][0]
+    return {
+        "text": choice["text"].strip(),
+        "finish_reason": choice.get("finish_reason"),
+        "usage": output.get("usage") or {},
+        "prompt_cache": prompt_cache,
+        "replica": replica.index,
+    }
+
+def refine_blocking(request: RefineRequest) -> dict:
+    started = time.perf_counter()
+    # The model stays loaded until every chunk is done, even if the default is swapped meanwhile
+    with registry.use(request.model) as pool:
+        system_prompt, prompt_id, chunks = plan_request(pool, request)
+        sampling = sampling_options(request)
+        # Chunks run concurrently across free replicas; map keeps them in input order
+        results = list(chunk_executor.map(
+            lambda chunk: refine_chunk(pool, system_prompt, prompt_id, chunk, sampling), chunks
+        ))
     
-    # Extract the response text
-    refined_text = output["choices"][0]["text"].strip()
-    
+    usage = {
+        key: sum(result["usage"].get(key, 0) for result in results)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
+    response = {
+        "status": "success",
+        "refined_text": stitch([result["text"] for result in results]),
+        "model": request.model,
+        "usage": usage,
+        "prompt_cache": results[0]["prompt_cache"],
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+    if len(chunks) > 1:
+        response["chunks"] = [
+            {
+                "index": chunk.index,
+                "input_tokens": chunk.input_tokens,
+                "max_tokens": chunk.max_tokens,
+                "completion_tokens": result["usage"].get("completion_tokens"),
+                "finish_reason": result["finish_reason"],
+                "replica": result["replica"],
+            }
+            for chunk, result in zip(chunks, results)
+        ]
+    return response
+
+def refine_incremental(request: RefineRequest) -> dict:
+    """Like refine_blocking, but only paragraphs missing from the cache reach the LLM."""
+    started = time.perf_counter()
+    paragraphs = plan_incremental(request)
+    todo = pending(paragraphs)
+    jobs, results = [], []
+    with registry.use(request.model) as pool:
+        sampling = sampling_options(request)
+        for paragraph in todo:
+            system_prompt, prompt_id, chunks = plan_request(pool, request, paragraph.text)
+            jobs += [(paragraph.key, chunk) for chunk in chunks]
+        # Changed paragraphs run concurrently across free replicas, like the chunks of a long document
+        if jobs:
+            results = list(chunk_executor.map(
+                lambda job: refine_chunk(pool, system_prompt, prompt_id, job[1], sampling), jobs
+            ))
+
+    refined = {}
+    for (key, _), result in zip(jobs, results):
+        refined.setdefault(key, []).append(result["text"])
+    for key, texts in refined.items():
+        refined[key] = stitch(texts)
+        store_paragraph(request, key, refined[key])
+
+    usage = {
+        key: sum(result["usage"].get(key, 0) for result in results)
+        for key in ("prompt_tokens", "completion_tokens", "total_tokens")
+    }
     return {
         "status": "success",
-        "refined_text": refined_text
+        "refined_text": stitch([
+            paragraph.cached if paragraph.cached is not None else refined.get(paragraph.key, "")
+            for paragraph in paragraphs
+        ]),
+        "model": request.model,
+        "usage": usage,
+        "paragraphs": summary(paragraphs),
+        "prompt_cache": results[0]["prompt_cache"] if results else None,
+        "seconds": round(time.perf_counter() - started, 3)
     }
 
+def refine_streaming(request: RefineRequest, chunk_mode: str, emit, stop: threading.Event):
+    """Blocking: runs on a worker thread, emitting events as tokens are generated."""
+    with registry.use(request.model) as pool:
+        if use_incremental(request):
+            refine_incremental_streaming(pool, request, chunk_mode, emit, stop)
+        else:
+            refine_pool_streaming(pool, request, chunk_mode, emit, stop)
+
+def stream_generate(replica, prompt: str, max_tokens: int, sampling: dict, chunk_mode: str,
+                    emit, stop: threading.Event, usage: UsageMeter) -> Optional[str]:
+    """Generate one prompt, emitting tokens or sentences. None if the client went away."""
+    chunker = SentenceChunker() if chunk_mode == "sentence" else None
+    pieces = []
+    stream = replica.model(
+        prompt, max_tokens=max_tokens, stop=STOP, stream=True, **sampling
+    )
+    for part in stream:
+        if stop.is_set():
+            # Client went away; leaving the generator stops decoding
+            return None
+        text = part["choices"][0]["text"]
+        usage.token()
+        pieces.append(text)
+        for piece in (chunker.feed(text) if chunker else [text]):
+            emit({"type": chunk_mode, "text": piece})
+    for piece in (chunker.flush() if chunker else []):
+        emit({"type": chunk_mode, "text": piece})
+    return "".join(pieces)
+
+def refine_pool_streaming(pool: ModelPool, request: RefineRequest, chunk_mode: str, emit, stop: threading.Event):
+    system_prompt, prompt_id, chunks = plan_request(pool, request)
+    sampling = sampling_options(request)
+    outputs = []
+    usage = UsageMeter(0)
+    # Chunks are generated in order on one replica so the stream reads top to bottom
+    with pool.acquire() as replica:
+        for chunk in chunks:
+            prompt, prompt_cache = prepare_prompt(replica, system_prompt, prompt_id, chunk.text)
+            usage.prompt_tokens += replica.count_tokens(prompt, special=True)
+            if chunk.index == 0:
+                emit({"type": "start", "chunks": len(chunks), "model": request.model, "prompt_cache": prompt_cache})
+            else:
+                emit({"type": chunk_mode, "text": CHUNK_SEPARATOR})
+            
+            output = stream_generate(replica, prompt, chunk.max_tokens, sampling, chunk_mode, emit, stop, usage)
+            if output is None:
+                return
+            outputs.append(output)
+    
+    emit({
+        "type": "done",
+        "refined_text": stitch(outputs),
+        "model": request.model,
+        "usage": usage.stats(),
+        "chunks": len(chunks)
+    })
+
+def refine_incremental_streaming(pool: ModelPool, request: RefineRequest, chunk_mode: str, emit, stop: threading.Event):
+    """Cached paragraphs are emitted whole, in place; changed ones are generated as they are reached."""
+    paragraphs = plan_incremental(request)
+    sampling = sampling_options(request)
+    outputs = []
+    refined = {}
+    usage = UsageMeter(0)
+    emit({"type": "start", "chunks": len(paragraphs), "model": request.model,
+          "paragraphs": summary(paragraphs), "prompt_cache": None})
+    with pool.acquire() as replica:
+        for paragraph in paragraphs:
+            if paragraph.index:
+                emit({"type": chunk_mode, "text": CHUNK_SEPARATOR})
+            text = paragraph.cached if paragraph.cached is not None else refined.get(paragraph.key)
+            if text is not None:
+                emit({"type": chunk_mode, "text": text})
+                outputs.append(text)
+                continue
+
+            system_prompt, prompt_id, chunks = plan_request(pool, request, paragraph.text)
+            pieces = []
+            for chunk in chunks:
+                prompt, _ = prepare_prompt(replica, system_prompt, prompt_id, chunk.text)
+                usage.prompt_tokens += replica.count_tokens(prompt, special=True)
+                if chunk.index:
+                    emit({"type": chunk_mode, "text": CHUNK_SEPARATOR})
+                output = stream_generate(replica, prompt, chunk.max_tokens, sampling, chunk_mode, emit, stop, usage)
+                if output is None:
+                    return
+                pieces.append(output)
+            refined[paragraph.key] = stitch(pieces)
+            store_paragraph(request, paragraph.key, refined[paragraph.key])
+            outputs.append(refined[paragraph.key])
+
+    emit({
+        "type": "done",
+        "refined_text": stitch(outputs),
+        "model": request.model,
+        "usage": usage.stats(),
+        "chunks": len(paragraphs),
+        "paragraphs": summary(paragraphs)
+    })
+
+# 2. API Endpoint for Text Refinement
+@app.post("/refine_text")
+async def refine_text(request: RefineRequest):
+    """
+    Refines a transcript in one prompt, or, when it does not fit N_CTX alongside
+    the system prompt and its output, in paragraph chunks stitched back in order.
+    With incremental=true (deterministic mode) only paragraphs not refined before reach the LLM.
+    """
+    if not model_ready():
+        return not_ready_response()
+    invalid = validate_request(request)
+    if invalid:
+        return invalid
+    mode = request.mode or DEFAULT_REFINEMENT_MODE
+
+    # A repeated deterministic refinement never needs a queue slot
+    key, cached = await run_in_threadpool(lookup_cache, request)
+    if cached:
+        return {**cached, "mode": mode, "cache": {"hit": True}}
+
+    try:
+        ticket = inference_queue.admit()
+    except QueueFullError as e:
+        return error_response("Refinement queue is full", 429, retry_after=e.retry_after)
+
+    try:
+        refine = refine_incremental if use_incremental(request) else refine_blocking
+        result = await inference_queue.run(ticket, refine, request)
+        if key:
+            refinement_cache.put(key, {
+                k: v for k, v in result.items() if k not in ("prompt_cache", "seconds", "paragraphs")
+            })
+        result["mode"] = mode
+        result["queue"] = ticket.summary()
+        result["cache"] = {"hit": False, "bypassed": request.cache_bypass}
+        return result
+    except ContextTooSmallError as e:
+        return error_response(str(e), 400)
+    except TicketCancelled:
+        return error_response("Request cancelled before inference started", 499)
+    finally:
+        inference_queue.release(ticket)
+
+async def replay_cached(cached: dict, mode: str, fmt: str, chunk_mode: str):
+    # The whole cached text as a single chunk event
+    yield encode_event({"type": "start", "chunks": 1, "prompt_cache": None}, fmt)
+    yield encode_event({"type": chunk_mode, "text": cached["refined_text"]}, fmt)
+    yield encode_event({
+        "type": "done",
+        "refined_text": cached["refined_text"],
+        "usage": cached.get("usage"),
+        "mode": mode,
+        "cache": {"hit": True},
+    }, fmt)
+
+@app.post("/refine_text/stream")
+async def refine_text_stream(request: RefineRequest, format: str = "sse", chunk: str = "token"):
+    """
+    Emits the refinement as it is generated: one event per token (chunk=token) or
+    per sentence (chunk=sentence), as SSE or NDJSON. A final "done" event carries
+    the full text and usage (prompt/completion tokens, tokens per second).
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        return error_response(f"Unsupported stream format: {format}", 400)
+    if chunk not in STREAM_CHUNKS:
+        return error_response(f"Unsupported chunk mode: {chunk}", 400)
+    if not model_ready():
+        return not_ready_response()
+    invalid = validate_request(request)
+    if invalid:
+        return invalid
+    mode = request.mode or DEFAULT_REFINEMENT_MODE
+
+    key, cached = await run_in_threadpool(lookup_cache, request)
+    if cached:
+        return StreamingResponse(replay_cached(cached, mode, format, chunk), media_type=STREAM_MEDIA_TYPES[format])
+
+    try:
+        ticket = inference_queue.admit()
+    except QueueFullError as e:
+        return error_response("Refinement queue is full", 429, retry_after=e.retry_after)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    stop = threading.Event()
+
+    def emit(event: dict):
+        # Called from the generation thread; only complete refinements are cached
+        if event["type"] == "done":
+            event["mode"] = mode
+            if key:
+                refinement_cache.put(key, {
+                    "status": "success",
+                    "refined_text": event["refined_text"],
+                    "model": event["model"],
+                    "usage": {k: event["usage"][k] for k in ("prompt_tokens", "completion_tokens", "total_tokens")},
+                })
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def produce():
+        try:
+            emit({"type": "queued", **ticket.summary()})
+            await inference_queue.run(ticket, refine_streaming, request, chunk, emit, stop)
+        except TicketCancelled:
+            pass
+        except Exception as e:
+            print(f"Streaming refinement failed: {e}")
+            events.put_nowait({"type": "error", "message": str(e)})
+        finally:
+            events.put_nowait(None)
+
+    async def body():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield encode_event(event, format)
+        finally:
+            # Client disconnected or stream finished; stop generating and free the queue slot
+            stop.set()
+            inference_queue.release(ticket)
+            await asyncio.shield(producer)
+
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[format])
+
+@app.get("/queue")
+def queue_status():
+    return {
+        **inference_queue.stats(),
+        "pools": {name: pool.stats() for name, pool in registry.loaded_pools()} if registry else None
+    }
+
+@app.get("/models")
+def list_models():
+    if not model_ready():
+        return not_ready_response()
+    return registry.stats()
+
+@app.post("/admin/default_model")
+def set_default_model(request: DefaultModelRequest):
+    """
+    Loads the model (if it is not already loaded), then makes it the default for
+    new requests. Requests already queued or running finish on the model they
+    were admitted with.
+    """
+    if not model_ready():
+        return not_ready_response()
+    try:
+        return {"status": "success", **registry.set_default(request.model)}
+    except UnknownModelError as e:
+        return error_response(str(e), 400)
+    except Exception as e:
+        print(f"Failed to load {request.model}: {e}")
+        return error_response(f"Failed to load {request.model}: {e}", 500)
+
+@app.get("/live")
+def liveness():
+    # The process is up and serving HTTP; says nothing about the model
+    return {"status": "alive"}
+
+@app.get("/ready")
+def readiness():
+    # Only route traffic here once the model is loaded; a missing GGUF or quantisation shows as failed
+    if model_ready():
+        return {"status": "ready", "startup": startup}
+    headers = {"Retry-After": str(STARTUP_RETRY_AFTER)} if startup["state"] == "starting" else None
+    return JSONResponse(status_code=503, content={"status": startup["state"], "startup": startup}, headers=headers)
+
 @app.get("/health")
 def health_check():
-    return {"status": "ok", "model_loaded": model is not None, "device": "cuda"}
\ No newline at end of file
+    return {
+        "status": "ok",
+        "model_loaded": registry is not None and registry.is_loaded(),
+        "startup": startup,
+        "device": LLAMA_CONFIG.device,
+        "engine": (registry.config if registry else LLAMA_CONFIG).describe(),
+        "speculative": describe_speculative(),
+        "models": registry.stats() if registry else None,
+        "queue": inference_queue.stats(),
+        "refinement_modes": {"default": DEFAULT_REFINEMENT_MODE, "available": sorted(REFINEMENT_MODES)},
+        "cache": refinement_cache.stats() if refinement_cache else {"enabled": False},
+        "prefix_cache": {
+            name: [
+                replica.prefix_cache.stats() if replica.prefix_cache else {"enabled": False}
+                for replica in pool.replicas
+            ]
+            for name, pool in registry.loaded_pools()
+        } if registry else {"enabled": False}
+    }
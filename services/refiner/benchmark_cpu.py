@@ -0,0 +1,143 @@
+"""
+CPU throughput benchmark for the LLM Refiner.
+
+Loads the model under each combination of thread count, batch-thread count,
+batch size, quantisation and mmap/mlock setting, and reports the two
+throughput numbers that size a CPU refiner node:
+
+    prompt eval tok/s   system prompt + transcript evaluated in N_BATCH steps
+    generation tok/s    tokens decoded one at a time after the prompt
+
+Each configuration refines the same fixture transcript; timings are the
+median of --repeat runs after one warm-up.
+
+Usage (inside the CPU refiner container):
+    python3 benchmark_cpu.py
+    python3 benchmark_cpu.py --threads 4,8 --batch-threads 8,16 --batch 256,512 --quants Q4_K_M,Q8_0
+    python3 benchmark_cpu.py fixtures/horse_report_first_gear.txt --mlock --json cpu.json
+"""
+import argparse
+import gc
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+from dataclasses import replace
+from typing import List, Optional
+
+from llama_cpp import Llama
+
+from app import DEFAULT_SYSTEM_PROMPT, STOP, build_prompt
+from llm_config import LlamaConfig, config_from_env, resolve_model_name
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "horse_report_first_gear.txt")
+
+
+def int_list(value: str) -> List[Optional[int]]:
+    # 0 = llama.cpp / profile default
+    return [int(v) or None for v in value.split(",") if v.strip()]
+
+
+def run_config(config: LlamaConfig, prompt: str, gen_tokens: int, repeat: int) -> dict:
+    started = time.perf_counter()
+    model = Llama(**config.llama_kwargs(), verbose=False)
+    load_seconds = time.perf_counter() - started
+    tokens = model.tokenize(prompt.encode("utf-8"), special=True)
+
+    prompt_rates, gen_rates = [], []
+    # The first pass is a warm-up and is not counted
+    for run in range(repeat + 1):
+        model.reset()
+        started = time.perf_counter()
+        model.eval(tokens)
+        prompt_seconds = time.perf_counter() - started
+
+        # The evaluated prompt is reused; only the new tokens are decoded
+        started = time.perf_counter()
+        output = model(prompt, max_tokens=gen_tokens, stop=STOP, temperature=0.0)
+        gen_seconds = time.perf_counter() - started
+        if run:
+            prompt_rates.append(len(tokens) / prompt_seconds)
+            gen_rates.append(output["usage"]["completion_tokens"] / gen_seconds)
+
+    del model
+    gc.collect()
+    return {
+        "model": config.model_name,
+        "quant": config.quant,
+        "n_threads": config.n_threads,
+        "n_threads_batch": config.n_threads_batch,
+        "n_batch": config.n_batch,
+        "use_mmap": config.use_mmap,
+        "use_mlock": config.use_mlock,
+        "load_seconds": round(load_seconds, 2),
+        "prompt_tokens": len(tokens),
+        "prompt_tokens_per_second": round(statistics.median(prompt_rates), 1),
+        "generation_tokens_per_second": round(statistics.median(gen_rates), 2),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Prompt-eval and generation tokens/s per CPU configuration")
+    parser.add_argument("fixture", nargs="?", default=FIXTURE, help="Transcript to refine (default: bundled fixture)")
+    parser.add_argument("--device", default="cpu", help="cpu (default) or cuda, to compare against the GPU node")
+    parser.add_argument("--threads", default="0", help="Comma-separated N_THREADS values (0 = profile default)")
+    parser.add_argument("--batch-threads", default="0", help="Comma-separated N_THREADS_BATCH values")
+    parser.add_argument("--batch", default="512", help="Comma-separated N_BATCH values")
+    parser.add_argument("--quants", default="", help="Comma-separated MODEL_QUANT values (default: MODEL_QUANT)")
+    parser.add_argument("--no-mmap", action="store_true", help="Read the GGUF into memory instead of mapping it")
+    parser.add_argument("--mlock", action="store_true", help="Pin the weights in RAM")
+    parser.add_argument("--gen-tokens", type=int, default=128, help="Tokens to generate per run")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per configuration")
+    parser.add_argument("--json", dest="json_path", help="Also write the full results to this file")
+    args = parser.parse_args()
+
+    with open(args.fixture, encoding="utf-8") as f:
+        prompt = build_prompt(DEFAULT_SYSTEM_PROMPT, f.read())
+
+    os.environ["LLM_DEVICE"] = args.device
+    base = config_from_env()
+    base_name = os.environ.get("MODEL_NAME", "mistral-7b-finetune.gguf")
+    quants = [q.strip() for q in args.quants.split(",") if q.strip()] or [base.quant]
+
+    configs = []
+    for quant, threads, batch_threads, batch in itertools.product(
+        quants, int_list(args.threads), int_list(args.batch_threads), int_list(args.batch)
+    ):
+        configs.append(replace(
+            base,
+            model_name=resolve_model_name(base.model_path, base_name, quant),
+            quant=quant,
+            n_threads=threads or base.n_threads,
+            n_threads_batch=batch_threads or base.n_threads_batch,
+            n_batch=batch or base.n_batch,
+            use_mmap=not args.no_mmap,
+            use_mlock=args.mlock,
+        ))
+
+    print(f"Benchmarking {len(configs)} configuration(s) on {os.cpu_count()} cores, "
+          f"fixture {os.path.basename(args.fixture)}")
+    results = []
+    for config in configs:
+        result = run_config(config, prompt, args.gen_tokens, args.repeat)
+        results.append(result)
+        print(f"  {result['model']}: threads {result['n_threads']}/{result['n_threads_batch']}, "
+              f"batch {result['n_batch']} -> prompt {result['prompt_tokens_per_second']} tok/s, "
+              f"generation {result['generation_tokens_per_second']} tok/s")
+
+    print(f"\n{'model':<36}{'thr':>5}{'bthr':>6}{'batch':>7}{'load s':>8}{'prompt t/s':>12}{'gen t/s':>10}")
+    for r in results:
+        print(f"{r['model']:<36}{r['n_threads'] or 0:>5}{r['n_threads_batch'] or 0:>6}{r['n_batch']:>7}"
+              f"{r['load_seconds']:>8.1f}{r['prompt_tokens_per_second']:>12.1f}{r['generation_tokens_per_second']:>10.2f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"device": args.device, "cores": os.cpu_count(), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,122 @@
+"""
+Speculative decoding benchmark for the LLM Refiner.
+
+Refines every fixture transcript with plain decoding and with prompt-lookup
+decoding at each draft length, greedily (temperature 0) so outputs can be
+compared. Reports generation tokens/s, the speedup over plain decoding,
+and whether each output is identical to the plain one.
+
+Usage (inside the refiner container):
+    python3 benchmark_speculative.py
+    python3 benchmark_speculative.py fixtures/ --pred-tokens 4,10,16 --ngram 2 --json results.json
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+from typing import List
+
+from llama_cpp import Llama
+
+from app import DEFAULT_SYSTEM_PROMPT, LLAMA_CONFIG, N_CTX, STOP, build_prompt
+from llm_config import LlamaConfig, resolve_model
+from long_document import output_budget
+from speculative import make_draft_model
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def find_fixtures(paths: List[str]) -> List[str]:
+    fixtures = []
+    for path in paths:
+        if os.path.isdir(path):
+            fixtures += [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".txt")]
+        elif os.path.isfile(path):
+            fixtures.append(path)
+    return fixtures
+
+
+def run_config(config: LlamaConfig, label: str, draft_model, fixtures: List[str]) -> dict:
+    model = Llama(**config.llama_kwargs(), draft_model=draft_model, verbose=False)
+    # Warm-up so the first fixture does not pay for kernel initialisation
+    model(build_prompt(DEFAULT_SYSTEM_PROMPT, "Warm-up."), max_tokens=8, temperature=0.0)
+
+    files = []
+    for path in fixtures:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        input_tokens = len(model.tokenize(text.encode("utf-8"), add_bos=False))
+        prompt = build_prompt(DEFAULT_SYSTEM_PROMPT, text)
+        started = time.perf_counter()
+        output = model(prompt, max_tokens=output_budget(input_tokens), stop=STOP, temperature=0.0)
+        elapsed = time.perf_counter() - started
+        completion_tokens = output["usage"]["completion_tokens"]
+        files.append({
+            "file": os.path.basename(path),
+            "completion_tokens": completion_tokens,
+            "seconds": round(elapsed, 3),
+            "tokens_per_second": round(completion_tokens / elapsed, 2) if elapsed else None,
+            "text": output["choices"][0]["text"].strip(),
+        })
+
+    del model
+    gc.collect()
+    tokens = sum(f["completion_tokens"] for f in files)
+    seconds = sum(f["seconds"] for f in files)
+    return {
+        "config": label,
+        "files": files,
+        "completion_tokens": tokens,
+        "seconds": round(seconds, 3),
+        "tokens_per_second": round(tokens / seconds, 2) if seconds else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare plain and prompt-lookup decoding by tokens/s and output")
+    parser.add_argument("fixtures", nargs="*", default=[FIXTURES_DIR],
+                        help="Transcript .txt files or directories of them (default: bundled fixtures)")
+    parser.add_argument("--pred-tokens", default="10",
+                        help="Comma-separated draft lengths to try (default: 10)")
+    parser.add_argument("--ngram", type=int, default=2, help="Longest n-gram matched against the prompt")
+    parser.add_argument("--json", dest="json_path", help="Also write the full results to this file")
+    args = parser.parse_args()
+
+    fixtures = find_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No .txt fixtures found in {', '.join(args.fixtures)}")
+        return 1
+    pred_tokens = [int(n) for n in args.pred_tokens.split(",") if n.strip()]
+    config = resolve_model(LLAMA_CONFIG)
+
+    print(f"Benchmarking {config.model_name} (n_ctx {N_CTX}) on {len(fixtures)} fixtures")
+    results = [run_config(config, "off", None, fixtures)]
+    for n in pred_tokens:
+        draft = make_draft_model("prompt_lookup", num_pred_tokens=n, max_ngram_size=args.ngram)
+        results.append(run_config(config, f"prompt_lookup/{n}", draft, fixtures))
+
+    baseline = results[0]
+    for result in results:
+        result["speedup"] = round(result["tokens_per_second"] / baseline["tokens_per_second"], 2) \
+            if result["tokens_per_second"] and baseline["tokens_per_second"] else None
+        # Greedy speculative decoding must not change the output
+        result["identical"] = all(
+            f["text"] == b["text"] for f, b in zip(result["files"], baseline["files"])
+        )
+
+    print(f"\n{'config':<20}{'tok/s':>10}{'speedup':>10}{'tokens':>10}{'identical':>11}")
+    for result in results:
+        print(f"{result['config']:<20}{result['tokens_per_second'] or 0:>10.1f}{result['speedup'] or 0:>10.2f}"
+              f"{result['completion_tokens']:>10}{str(result['identical']):>11}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"model": config.model_name, "n_ctx": N_CTX, "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
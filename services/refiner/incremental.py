@@ -0,0 +1,74 @@
+"""
+Paragraph-level incremental refinement for the LLM Refiner.
+
+Weekly miStable reports for the same horse repeat most of their paragraphs
+word for word. In incremental mode a transcript is refined one paragraph at
+a time. Each paragraph's refinement is stored in the refinement cache, keyed
+by a hash of the model, the system prompt (and so the persona), the
+sampling settings and the paragraph text. The next report then only sends
+the paragraphs that changed to the LLM; the rest are read back from the
+cache and stitched in order.
+
+Paragraphs are compared with whitespace collapsed, so re-wrapped lines and
+trailing spaces still hit. A paragraph repeated within one transcript is
+refined once. Only deterministic refinements are refined this way: creative
+output differs on every run, so a creative request with incremental set is
+refined whole and never touches the cache.
+"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+from result_cache import cache_key
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+@dataclass
+class Paragraph:
+    index: int
+    text: str
+    key: str
+    # Refined text from the cache; None = the LLM has to refine it
+    cached: Optional[str] = None
+
+
+def split_paragraphs(text: str) -> List[str]:
+    return [paragraph.strip() for paragraph in _PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+
+
+def paragraph_key(model_sha256: str, system_prompt: str, paragraph: str, options: dict) -> str:
+    normalised = " ".join(paragraph.split())
+    return cache_key(model_sha256, system_prompt, normalised, {**options, "unit": "paragraph"})
+
+
+def plan_paragraphs(text: str, model_sha256: str, system_prompt: str, options: dict, cache=None) -> List[Paragraph]:
+    """Split text into paragraphs and attach any cached refinement of each."""
+    paragraphs = []
+    for index, paragraph in enumerate(split_paragraphs(text)):
+        key = paragraph_key(model_sha256, system_prompt, paragraph, options)
+        hit = cache.get(key) if cache else None
+        paragraphs.append(Paragraph(index, paragraph, key, hit["refined_text"] if hit else None))
+    return paragraphs
+
+
+def pending(paragraphs: List[Paragraph]) -> List[Paragraph]:
+    """Paragraphs the LLM has to refine, each distinct paragraph once, in input order."""
+    seen, result = set(), []
+    for paragraph in paragraphs:
+        if paragraph.cached is None and paragraph.key not in seen:
+            seen.add(paragraph.key)
+            result.append(paragraph)
+    return result
+
+
+def summary(paragraphs: List[Paragraph]) -> dict:
+    refined = len(pending(paragraphs))
+    cached = sum(1 for paragraph in paragraphs if paragraph.cached is not None)
+    return {
+        "total": len(paragraphs),
+        "cached": cached,
+        "refined": refined,
+        # Repeats of a paragraph refined earlier in the same transcript
+        "repeated": len(paragraphs) - cached - refined,
+    }
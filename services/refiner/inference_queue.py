@@ -0,0 +1,169 @@
+"""
+Bounded inference queue for the LLM Refiner.
+
+llama.cpp generation is blocking and can run for tens of seconds, so it must
+never run on the event loop. Requests are admitted into a queue of fixed
+depth and executed on a dedicated executor. It has one slot per model
+replica (LLM_REPLICAS), so concurrent jobs run in parallel instead of queuing
+behind one another. When the queue is full, admission fails immediately with
+a Retry-After estimate so callers get a real backpressure signal instead of
+a hung socket.
+"""
+import asyncio
+import math
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Optional
+
+from model_pool import LLM_REPLICAS
+
+INFERENCE_QUEUE_DEPTH = int(os.environ.get("INFERENCE_QUEUE_DEPTH", "16"))
+# Parallel slots; one per replica unless set explicitly
+INFERENCE_CONCURRENCY = int(os.environ.get("INFERENCE_CONCURRENCY", str(LLM_REPLICAS)))
+# Service-time estimate (seconds per request) used until real timings exist
+INFERENCE_DEFAULT_SECONDS = float(os.environ.get("INFERENCE_DEFAULT_SECONDS", "20"))
+MAX_RETRY_AFTER = int(os.environ.get("MAX_RETRY_AFTER", "300"))
+
+# Smoothing factor for the service-time moving average
+_EWMA_ALPHA = 0.2
+
+
+class QueueFullError(Exception):
+    """Raised by admit() when no queue slot is free."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Inference queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class TicketCancelled(Exception):
+    """Raised inside the worker when a ticket was abandoned before it started."""
+
+
+@dataclass
+class Ticket:
+    position: int
+    eta_seconds: float
+    admitted_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    released: bool = False
+
+    def summary(self) -> dict:
+        now = time.monotonic()
+        started = self.started_at or now
+        return {
+            "position": self.position,
+            "eta_seconds": round(self.eta_seconds, 1),
+            "wait_seconds": round(started - self.admitted_at, 3),
+            "run_seconds": round((self.finished_at or now) - started, 3) if self.started_at else 0.0,
+        }
+
+
+class InferenceQueue:
+    def __init__(
+        self,
+        max_depth: int = INFERENCE_QUEUE_DEPTH,
+        concurrency: int = INFERENCE_CONCURRENCY,
+        executor: Optional[Executor] = None,
+    ):
+        self.max_depth = max_depth
+        self.concurrency = max(1, concurrency)
+        self.executor = executor or ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="llama"
+        )
+        self._lock = threading.Lock()
+        self._waiting = 0
+        self._running = 0
+        self._avg_seconds: Optional[float] = None
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    @property
+    def service_seconds(self) -> float:
+        return self._avg_seconds if self._avg_seconds is not None else INFERENCE_DEFAULT_SECONDS
+
+    def _eta(self, ahead: int) -> float:
+        # Requests ahead drain `concurrency` at a time, then this one runs
+        return (ahead / self.concurrency + 1) * self.service_seconds
+
+    def retry_after(self) -> int:
+        # Roughly when the head of the queue will have moved into a slot
+        seconds = math.ceil(self.service_seconds / self.concurrency)
+        return max(1, min(MAX_RETRY_AFTER, seconds))
+
+    def admit(self) -> Ticket:
+        """Reserve a queue slot or raise QueueFullError."""
+        with self._lock:
+            if self._waiting >= self.max_depth:
+                self._rejected += 1
+                raise QueueFullError(self.retry_after())
+            ahead = max(0, self._waiting + self._running - self.concurrency + 1)
+            self._waiting += 1
+            return Ticket(position=ahead, eta_seconds=self._eta(ahead))
+
+    def release(self, ticket: Ticket):
+        """Give back a ticket's slot. Safe to call more than once and after run()."""
+        with self._lock:
+            if ticket.released:
+                return
+            ticket.released = True
+            if ticket.started_at is None:
+                self._waiting -= 1
+
+    async def run(self, ticket: Ticket, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn on the inference executor under an admitted ticket."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._call, ticket, fn, args, kwargs)
+
+    def _call(self, ticket: Ticket, fn: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        with self._lock:
+            if ticket.released:
+                # Caller went away while queued; don't burn inference time on it
+                raise TicketCancelled()
+            started = time.monotonic()
+            ticket.started_at = started
+            self._waiting -= 1
+            self._running += 1
+
+        ok = False
+        try:
+            result = fn(*args, **kwargs)
+            ok = True
+            return result
+        finally:
+            finished = time.monotonic()
+            with self._lock:
+                self._running -= 1
+                ticket.finished_at = finished
+                if ok:
+                    self._completed += 1
+                    self._record(finished - started)
+                else:
+                    self._failed += 1
+
+    def _record(self, seconds: float):
+        if self._avg_seconds is None:
+            self._avg_seconds = seconds
+        else:
+            self._avg_seconds = _EWMA_ALPHA * seconds + (1 - _EWMA_ALPHA) * self._avg_seconds
+
+    def stats(self) -> dict:
+        with self._lock:
+            ahead = max(0, self._waiting + self._running - self.concurrency + 1)
+            return {
+                "waiting": self._waiting,
+                "running": self._running,
+                "max_depth": self.max_depth,
+                "concurrency": self.concurrency,
+                "full": self._waiting >= self.max_depth,
+                "avg_service_seconds": round(self.service_seconds, 2),
+                "eta_seconds": round(self._eta(ahead), 1),
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+            }
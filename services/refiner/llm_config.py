@@ -0,0 +1,128 @@
+"""
+llama.cpp engine configuration for the LLM Refiner.
+
+On the GPU node every layer is offloaded (N_GPU_LAYERS=-1). The CPU profile
+(LLM_DEVICE=cpu) runs on commodity cores instead. There the settings that
+matter are:
+
+    N_THREADS         threads for token generation (memory-bound; physical cores)
+    N_THREADS_BATCH   threads for prompt evaluation (compute-bound; all cores)
+    N_BATCH           prompt tokens evaluated per forward pass
+    USE_MMAP          map the GGUF instead of reading it (fast load, shared page cache)
+    USE_MLOCK         pin the weights in RAM so they are never paged out
+    MODEL_QUANT       quantisation to load, e.g. Q4_K_M picks mistral-7b-finetune.Q4_K_M.gguf
+
+Threads left at 0 use the defaults below, split evenly across LLM_REPLICAS so
+replicas do not oversubscribe the cores.
+"""
+import os
+from dataclasses import asdict, dataclass, replace
+from typing import Optional
+
+from model_pool import LLM_REPLICAS
+
+DEVICES = ("cuda", "cpu")
+
+
+@dataclass
+class LlamaConfig:
+    model_path: str
+    model_name: str
+    device: str
+    n_gpu_layers: int
+    n_ctx: int
+    n_threads: Optional[int] = None
+    n_threads_batch: Optional[int] = None
+    n_batch: int = 512
+    use_mmap: bool = True
+    use_mlock: bool = False
+    quant: Optional[str] = None
+
+    @property
+    def model_file(self) -> str:
+        return os.path.join(self.model_path, self.model_name)
+
+    def llama_kwargs(self) -> dict:
+        """Keyword arguments for llama_cpp.Llama."""
+        return {
+            "model_path": self.model_file,
+            "n_gpu_layers": self.n_gpu_layers,
+            "n_ctx": self.n_ctx,
+            "n_threads": self.n_threads,
+            "n_threads_batch": self.n_threads_batch,
+            "n_batch": self.n_batch,
+            "use_mmap": self.use_mmap,
+            "use_mlock": self.use_mlock,
+        }
+
+    def describe(self) -> dict:
+        return asdict(self)
+
+
+def resolve_device(requested: str) -> str:
+    requested = requested.lower()
+    if requested == "auto":
+        import llama_cpp
+
+        return "cuda" if llama_cpp.llama_supports_gpu_offload() else "cpu"
+    if requested not in DEVICES:
+        raise ValueError(f"Unsupported LLM_DEVICE: {requested}")
+    return requested
+
+
+def resolve_model_name(model_path: str, model_name: str, quant: Optional[str]) -> str:
+    """The GGUF for a quantisation: <stem>.<QUANT>.gguf or <stem>-<QUANT>.gguf next to MODEL_NAME."""
+    if not quant:
+        return model_name
+    stem = model_name[:-len(".gguf")] if model_name.endswith(".gguf") else model_name
+    wanted = {f"{stem}.{quant}.gguf".lower(), f"{stem}-{quant}.gguf".lower()}
+    available = sorted(name for name in os.listdir(model_path) if name.endswith(".gguf"))
+    for name in available:
+        if name.lower() in wanted:
+            return name
+    raise FileNotFoundError(
+        f"No {quant} quantisation of {stem} in {model_path} (available: {', '.join(available) or 'none'})"
+    )
+
+
+def resolve_model(config: LlamaConfig) -> LlamaConfig:
+    """config with model_name set to the GGUF for its quantisation. Raises FileNotFoundError."""
+    name = resolve_model_name(config.model_path, config.model_name, config.quant)
+    if not os.path.isfile(os.path.join(config.model_path, name)):
+        raise FileNotFoundError(f"Model not found: {os.path.join(config.model_path, name)}")
+    return replace(config, model_name=name)
+
+
+def _threads(name: str, default: int) -> Optional[int]:
+    value = int(os.environ.get(name, "0"))
+    return value if value > 0 else default
+
+
+def config_from_env() -> LlamaConfig:
+    """Settings from the environment only; the model file is checked later by resolve_model."""
+    device = resolve_device(os.environ.get("LLM_DEVICE", "cuda"))
+    model_path = os.environ.get("MODEL_PATH", "/app/models/")
+    quant = os.environ.get("MODEL_QUANT") or None
+    cores = os.cpu_count() or 1
+    if device == "cpu":
+        # Generation saturates memory bandwidth well before it uses hyperthreads
+        n_threads = _threads("N_THREADS", max(1, cores // 2 // LLM_REPLICAS))
+        n_threads_batch = _threads("N_THREADS_BATCH", max(1, cores // LLM_REPLICAS))
+    else:
+        # The GPU does the work; None keeps llama.cpp's defaults unless set explicitly
+        n_threads = _threads("N_THREADS", None)
+        n_threads_batch = _threads("N_THREADS_BATCH", None)
+    return LlamaConfig(
+        model_path=model_path,
+        model_name=os.environ.get("MODEL_NAME", "mistral-7b-finetune.gguf"),
+        device=device,
+        # -1 loads all layers to VRAM; the CPU profile never offloads
+        n_gpu_layers=0 if device == "cpu" else int(os.environ.get("N_GPU_LAYERS", "-1")),
+        n_ctx=int(os.environ.get("N_CTX", "4096")),
+        n_threads=n_threads,
+        n_threads_batch=n_threads_batch,
+        n_batch=int(os.environ.get("N_BATCH", "512")),
+        use_mmap=os.environ.get("USE_MMAP", "true").lower() == "true",
+        use_mlock=os.environ.get("USE_MLOCK", "false").lower() == "true",
+        quant=quant,
+    )
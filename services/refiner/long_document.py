@@ -0,0 +1,126 @@
+"""
+Long-document planning for the LLM Refiner.
+
+A transcript is refined in one prompt only if the system prompt, the
+transcript and room for the refined output all fit in N_CTX. Otherwise it is
+split on paragraph boundaries (then sentences, then words), counting tokens
+with the model's own tokenizer, and each chunk is refined separately and the
+results stitched back in order.
+
+The output budget is sized from the input: a refinement is roughly as long
+as its source, so max_tokens = input tokens * REFINE_OUTPUT_RATIO +
+REFINE_OUTPUT_MARGIN, capped by whatever context remains.
+"""
+import math
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, List
+
+REFINE_OUTPUT_RATIO = float(os.environ.get("REFINE_OUTPUT_RATIO", "1.3"))
+REFINE_OUTPUT_MARGIN = int(os.environ.get("REFINE_OUTPUT_MARGIN", "64"))
+# Smallest input chunk worth a prompt; below this the system prompt leaves no room
+MIN_CHUNK_TOKENS = 64
+# Tokens held back for tokenizer differences at chunk joins
+CONTEXT_SAFETY_TOKENS = 16
+
+CHUNK_SEPARATOR = "\n\n"
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+class ContextTooSmallError(ValueError):
+    """The system prompt leaves too little of N_CTX for any transcript text."""
+
+
+@dataclass
+class Chunk:
+    index: int
+    text: str
+    input_tokens: int
+    max_tokens: int
+
+
+def output_budget(input_tokens: int) -> int:
+    return math.ceil(input_tokens * REFINE_OUTPUT_RATIO) + REFINE_OUTPUT_MARGIN
+
+
+def input_budget(n_ctx: int, overhead_tokens: int) -> int:
+    """Largest input (in tokens) whose prompt plus output budget fits in n_ctx."""
+    available = n_ctx - overhead_tokens - CONTEXT_SAFETY_TOKENS - REFINE_OUTPUT_MARGIN
+    budget = int(available / (1 + REFINE_OUTPUT_RATIO))
+    if budget < MIN_CHUNK_TOKENS:
+        raise ContextTooSmallError(
+            f"System prompt uses {overhead_tokens} of {n_ctx} context tokens; no room left for the transcript"
+        )
+    return budget
+
+
+def _pieces(text: str, budget: int, count: Callable[[str], int]) -> List[tuple]:
+    """(text, tokens) pieces of at most budget tokens: paragraphs, else sentences, else words."""
+    pieces = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count(paragraph)
+        if tokens <= budget:
+            pieces.append((paragraph, tokens))
+            continue
+        for sentence in _SENTENCE_END.split(paragraph):
+            tokens = count(sentence)
+            if tokens <= budget:
+                pieces.append((sentence, tokens))
+                continue
+            # A single run-on "sentence" longer than the budget: cut between words
+            words, current = sentence.split(), []
+            for word in words:
+                if current and count(" ".join(current + [word])) > budget:
+                    pieces.append((" ".join(current), count(" ".join(current))))
+                    current = []
+                current.append(word)
+            if current:
+                pieces.append((" ".join(current), count(" ".join(current))))
+    return pieces
+
+
+def plan_chunks(
+    text: str, n_ctx: int, overhead_tokens: int, count: Callable[[str], int], split: bool = True
+) -> List[Chunk]:
+    """
+    Split text into chunks that each fit n_ctx with the prompt overhead and
+    their own output budget. A text that fits whole (or split=False) is a
+    single chunk. count returns the model tokenizer's token count for a piece of text.
+    """
+    budget = input_budget(n_ctx, overhead_tokens)
+    total = count(text)
+    if total <= budget or not split:
+        return [Chunk(0, text, total, _cap(total, n_ctx, overhead_tokens))]
+
+    groups, current, current_tokens = [], [], 0
+    for piece, tokens in _pieces(text, budget, count):
+        # +2 for the paragraph break joining pieces within a chunk
+        if current and current_tokens + tokens + 2 > budget:
+            groups.append(current)
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens + 2
+    if current:
+        groups.append(current)
+
+    chunks = []
+    for index, group in enumerate(groups):
+        chunk_text = CHUNK_SEPARATOR.join(group)
+        tokens = count(chunk_text)
+        chunks.append(Chunk(index, chunk_text, tokens, _cap(tokens, n_ctx, overhead_tokens)))
+    return chunks
+
+
+def _cap(input_tokens: int, n_ctx: int, overhead_tokens: int) -> int:
+    remaining = n_ctx - overhead_tokens - input_tokens - CONTEXT_SAFETY_TOKENS
+    return max(1, min(output_budget(input_tokens), remaining))
+
+
+def stitch(outputs: List[str]) -> str:
+    return CHUNK_SEPARATOR.join(output.strip() for output in outputs if output.strip())
@@ -0,0 +1,67 @@
+"""
+Pool of llama.cpp contexts for the LLM Refiner.
+
+A llama-cpp-python Llama object runs one sequence at a time, so
+LLM_REPLICAS > 1 loads that many independent contexts of the model. Each
+replica has its own KV cache and system-prompt prefix cache. Requests, and
+the chunks of a long document, take whichever replica is free. Each replica
+holds its own copy of the weights, so size LLM_REPLICAS to fit VRAM.
+"""
+import os
+import queue
+import time
+from contextlib import contextmanager
+from typing import Callable, List, Optional
+
+from prefix_cache import PREFIX_CACHE_ENABLED, PrefixCache
+
+LLM_REPLICAS = max(1, int(os.environ.get("LLM_REPLICAS", "1")))
+
+
+class Replica:
+    def __init__(self, index: int, model):
+        self.index = index
+        self.model = model
+        # Evaluated system-prompt prefixes, restored per request (PREFIX_CACHE_*)
+        self.prefix_cache = PrefixCache(model) if PREFIX_CACHE_ENABLED else None
+        self.requests = 0
+
+    def count_tokens(self, text: str, special: bool = False) -> int:
+        return len(self.model.tokenize(text.encode("utf-8"), add_bos=False, special=special))
+
+
+class ModelPool:
+    def __init__(self, load: Callable[[], object], replicas: int = LLM_REPLICAS):
+        self.replicas: List[Replica] = []
+        self._free: "queue.Queue[Replica]" = queue.Queue()
+        for index in range(replicas):
+            started = time.monotonic()
+            replica = Replica(index, load())
+            print(f"Loaded LLM replica {index} in {time.monotonic() - started:.1f}s")
+            self.replicas.append(replica)
+            self._free.put(replica)
+
+    @property
+    def n_ctx(self) -> int:
+        return self.replicas[0].model.n_ctx()
+
+    @contextmanager
+    def acquire(self, timeout: Optional[float] = None):
+        """Exclusive use of a free replica for one generation."""
+        replica = self._free.get(timeout=timeout)
+        try:
+            replica.requests += 1
+            yield replica
+        finally:
+            self._free.put(replica)
+
+    def any(self) -> Replica:
+        # Tokenizing is read-only and safe alongside a running generation
+        return self.replicas[0]
+
+    def stats(self) -> dict:
+        return {
+            "replicas": len(self.replicas),
+            "free": self._free.qsize(),
+            "requests": [replica.requests for replica in self.replicas],
+        }
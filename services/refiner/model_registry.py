@@ -0,0 +1,194 @@
+"""
+GGUF model registry for the LLM Refiner.
+
+Instead of one model fixed at startup, the refiner hosts a set of GGUF files
+from the models volume (LLM_MODELS): for example, the production fine-tune
+next to a candidate fine-tune or a smaller quantisation. Models are loaded
+lazily and memory-mapped (USE_MMAP), each as a pool of LLM_REPLICAS contexts.
+They are kept under LLM_MEMORY_BUDGET_MB; idle models are unloaded least
+recently used first.
+
+The default model can be swapped at runtime. The new model is loaded
+before the switch, and the switch itself is a single assignment. Requests
+already running hold their own model, so nothing in flight is dropped.
+"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Callable, List, Optional
+
+from llm_config import LlamaConfig
+from model_pool import LLM_REPLICAS, ModelPool
+from result_cache import REFINE_CACHE_ENABLED, model_fingerprint
+
+# 0 = no budget; every requested model stays loaded
+LLM_MEMORY_BUDGET_MB = int(os.environ.get("LLM_MEMORY_BUDGET_MB", "0"))
+
+
+class UnknownModelError(ValueError):
+    pass
+
+
+class _Entry:
+    def __init__(self, name: str):
+        self.name = name
+        self.pool: Optional[ModelPool] = None
+        self.in_use = 0
+        self.last_used = 0.0
+        self.load_seconds = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        config: LlamaConfig,
+        load: Callable[[LlamaConfig], object],
+        on_load: Optional[Callable[[ModelPool], None]] = None,
+        models: Optional[List[str]] = None,
+        budget_mb: int = LLM_MEMORY_BUDGET_MB,
+    ):
+        self.config = config
+        self.load = load
+        self.on_load = on_load
+        self.default_model = config.model_name
+        self.budget_mb = budget_mb
+        self.swaps = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        configured = [
+            name.strip() for name in os.environ.get("LLM_MODELS", "").split(",") if name.strip()
+        ] if models is None else models
+        for name in dict.fromkeys([config.model_name, *configured]):
+            self._entries[name] = _Entry(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.config.model_path, name)
+
+    def size_mb(self, name: str) -> int:
+        # Mapped weights for each replica; the KV cache is small next to a 7B model
+        try:
+            return int(os.path.getsize(self.path(name)) / 1e6) * LLM_REPLICAS
+        except OSError:
+            return 0
+
+    def _entry(self, name: Optional[str]) -> _Entry:
+        name = name or self.default_model
+        entry = self._entries.get(name)
+        if entry is not None:
+            return entry
+        # A GGUF dropped into the models volume after startup can be used without a restart
+        if name.endswith(".gguf") and os.path.basename(name) == name and os.path.isfile(self.path(name)):
+            with self._lock:
+                return self._entries.setdefault(name, _Entry(name))
+        raise UnknownModelError(f"Model not found in {self.config.model_path}: {name}")
+
+    def resolve(self, name: Optional[str] = None) -> str:
+        """The model a request will run on; raises UnknownModelError."""
+        return self._entry(name).name
+
+    def fingerprint(self, name: Optional[str] = None) -> str:
+        """SHA-256 of the GGUF, hashed when the model loads; re-hashed if the file has changed since."""
+        return model_fingerprint(self.path(self._entry(name).name))
+
+    @contextmanager
+    def use(self, name: Optional[str] = None):
+        """Yield a loaded ModelPool, loading it (and unloading idle models) if needed."""
+        entry = self._entry(name)
+
+        with self._lock:
+            entry.in_use += 1
+        try:
+            with entry.lock:
+                if entry.pool is None:
+                    self._make_room(entry)
+                    started = time.monotonic()
+                    print(f"Loading LLM {entry.name} ({self.size_mb(entry.name)} MB mapped)")
+                    config = replace(self.config, model_name=entry.name)
+                    pool = ModelPool(lambda: self.load(config))
+                    if REFINE_CACHE_ENABLED:
+                        # Hash now, on the loading thread, so cache lookups never have to
+                        model_fingerprint(self.path(entry.name))
+                    if self.on_load:
+                        self.on_load(pool)
+                    entry.load_seconds = round(time.monotonic() - started, 2)
+                    entry.pool = pool
+                    entry.loads += 1
+            with self._lock:
+                entry.last_used = time.monotonic()
+            yield entry.pool
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+
+    def preload(self, name: Optional[str] = None) -> dict:
+        """Load a model now. Returns its load timing."""
+        with self.use(name):
+            pass
+        entry = self._entry(name)
+        return {"model": entry.name, "load_seconds": entry.load_seconds or 0.0}
+
+    def set_default(self, name: str) -> dict:
+        """Load name, then make it the default. In-flight requests finish on the previous model."""
+        loaded = self.preload(name)
+        with self._lock:
+            previous, self.default_model = self.default_model, name
+            self.swaps += 1
+        print(f"Default LLM swapped: {previous} -> {name}")
+        return {"previous": previous, "default": name, **loaded}
+
+    def _make_room(self, incoming: _Entry):
+        if not self.budget_mb:
+            return
+        with self._lock:
+            loaded = [e for e in self._entries.values() if e.pool is not None and e is not incoming]
+            used = sum(self.size_mb(e.name) for e in loaded)
+            needed = self.size_mb(incoming.name)
+            for victim in sorted(loaded, key=lambda e: e.last_used):
+                if used + needed <= self.budget_mb:
+                    break
+                if victim.in_use:
+                    continue
+                print(f"Unloading LLM {victim.name} to stay within {self.budget_mb} MB")
+                victim.pool = None
+                used -= self.size_mb(victim.name)
+            if used + needed > self.budget_mb:
+                print(f"WARNING: loading {incoming.name} exceeds the model memory budget "
+                      f"({used + needed} > {self.budget_mb} MB); all other models are busy")
+        gc.collect()
+
+    def is_loaded(self, name: Optional[str] = None) -> bool:
+        entry = self._entries.get(name or self.default_model)
+        return entry is not None and entry.pool is not None
+
+    def loaded_pools(self) -> List[tuple]:
+        with self._lock:
+            return [(e.name, e.pool) for e in self._entries.values() if e.pool is not None]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default": self.default_model,
+                "budget_mb": self.budget_mb,
+                "swaps": self.swaps,
+                "models": {
+                    e.name: {
+                        "loaded": e.pool is not None,
+                        "in_use": e.in_use,
+                        "size_mb": self.size_mb(e.name),
+                        "loads": e.loads,
+                        "load_seconds": e.load_seconds,
+                        "pool": e.pool.stats() if e.pool else None,
+                    }
+                    for e in self._entries.values()
+                },
+            }
@@ -0,0 +1,96 @@
+"""
+System-prompt prefix state cache for the LLM Refiner.
+
+Every request starts with the same few hundred tokens of brand/persona system
+prompt. Each distinct prompt prefix is evaluated once; the resulting llama.cpp
+state (KV cache + token ids) is saved and kept in an LRU keyed by the SHA-256 of
+the prefix text. A request restores the saved state and llama.cpp's own
+longest-prefix check then only evaluates the transcript and instruction tail.
+
+States hold the KV cache for the prefix tokens, so the LRU is bounded by bytes
+(PREFIX_CACHE_MAX_BYTES) rather than by entry count.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+PREFIX_CACHE_ENABLED = os.environ.get("PREFIX_CACHE_ENABLED", "true").lower() == "true"
+PREFIX_CACHE_MAX_BYTES = int(os.environ.get("PREFIX_CACHE_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def prefix_key(prefix: str) -> str:
+    return hashlib.sha256(prefix.encode("utf-8")).hexdigest()
+
+
+class PrefixCache:
+    def __init__(self, model, max_bytes: int = PREFIX_CACHE_MAX_BYTES):
+        self.model = model
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # key -> (label, prefix tokens, LlamaState, size in bytes)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def _resident(self, tokens: list) -> bool:
+        # The model still holds this prefix from the previous request; nothing to restore
+        n = len(tokens)
+        return self.model.n_tokens >= n and list(self.model._input_ids[:n]) == tokens
+
+    def prepare(self, prefix: str, label: Optional[str] = None) -> dict:
+        """
+        Leave the model holding the evaluated prefix, restoring a saved state or
+        evaluating and saving it. Must be called under the caller's inference lock.
+        """
+        key = prefix_key(prefix)
+        label = label or key[:12]
+        started = time.perf_counter()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+
+        if entry is not None:
+            _, tokens, state, _ = entry
+            if not self._resident(tokens):
+                self.model.load_state(state)
+            return {"id": label, "hit": True, "prefix_tokens": len(tokens),
+                    "seconds": round(time.perf_counter() - started, 4)}
+
+        tokens = self.model.tokenize(prefix.encode("utf-8"), special=True)
+        if not self._resident(tokens):
+            self.model.reset()
+            self.model.eval(tokens)
+        state = self.model.save_state()
+        size = int(state.llama_state_size)
+        with self._lock:
+            self.misses += 1
+            if size <= self.max_bytes:
+                if key in self._entries:
+                    self.bytes -= self._entries.pop(key)[3]
+                self._entries[key] = (label, tokens, state, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self.bytes -= evicted[3]
+        print(f"Cached prompt prefix {label}: {len(tokens)} tokens, {size / 1e6:.1f} MB state")
+        return {"id": label, "hit": False, "prefix_tokens": len(tokens),
+                "seconds": round(time.perf_counter() - started, 4)}
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "entries": [label for label, _, _, _ in self._entries.values()],
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,144 @@
+"""
+Persistent refinement cache for the LLM Refiner.
+
+A deterministic refinement (greedy decoding, fixed seed) of the same
+transcript with the same model and prompt is always the same text, so
+reprocessing a job after an unrelated pipeline change need not touch the GPU.
+Results are stored in SQLite. The key is a SHA-256 of the model file's
+identity, the system prompt, the input text and every sampling parameter
+that changes the output. Total size is bounded, and least recently used
+entries are evicted first.
+
+The model identity is the SHA-256 of the whole GGUF file. Two fine-tunes of
+the same base can share their embeddings and output layers and differ only in
+the middle, so nothing short of the full file tells them apart. Hashing takes
+a few seconds per gigabyte. It is done once, when a model is loaded, and
+remembered per path until the file's size or mtime changes. The hash stays
+the same when the file is copied to another node sharing the cache.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+REFINE_CACHE_ENABLED = os.environ.get("REFINE_CACHE_ENABLED", "true").lower() == "true"
+REFINE_CACHE_PATH = os.environ.get("REFINE_CACHE_PATH", "/app/processed_data/refinements.sqlite3")
+REFINE_CACHE_MAX_BYTES = int(os.environ.get("REFINE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+_HASH_BLOCK_BYTES = 8 * 1024 * 1024
+
+# path -> ((size, mtime_ns), sha256)
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def model_fingerprint(path: str) -> str:
+    """SHA-256 of the whole file; blocking, so call it off the event loop."""
+    stat = os.stat(path)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    with _fingerprints_lock:
+        known = _fingerprints.get(path)
+    if known and known[0] == stamp:
+        return known[1]
+
+    started = time.monotonic()
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+    with _fingerprints_lock:
+        _fingerprints[path] = (stamp, sha256)
+    print(f"Fingerprinted {os.path.basename(path)} in {time.monotonic() - started:.1f}s: {sha256[:12]}")
+    return sha256
+
+
+def cache_key(model_sha256: str, system_prompt: str, raw_text: str, options: dict) -> str:
+    digest = hashlib.sha256()
+    for part in (model_sha256, system_prompt, raw_text, json.dumps(options, sort_keys=True, separators=(",", ":"))):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class RefinementCache:
+    def __init__(self, path: str = REFINE_CACHE_PATH, max_bytes: int = REFINE_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS refinements ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS refinements_accessed ON refinements (accessed_at)")
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT value FROM refinements WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE refinements SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, value: dict):
+        payload = json.dumps(value)
+        size = len(payload.encode())
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO refinements (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, size, now, now),
+            )
+            self._evict()
+
+    def note_bypass(self):
+        with self._lock:
+            self.bypassed += 1
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM refinements").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, size FROM refinements ORDER BY accessed_at").fetchall()
+        doomed = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            total -= size
+        self._db.executemany("DELETE FROM refinements WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, total = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM refinements"
+            ).fetchone()
+            lookups = self.hits + self.misses
+            return {
+                "enabled": True,
+                "path": self.path,
+                "entries": entries,
+                "bytes": total,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypassed": self.bypassed,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
@@ -0,0 +1,47 @@
+"""
+Speculative decoding for the LLM Refiner.
+
+A refinement mostly copies spans of the transcript with light edits, so
+prompt-lookup decoding suits it well. Draft tokens are proposed by matching
+the last few generated tokens (an n-gram) against the prompt and copying what
+followed; the model verifies the whole draft in one batched forward pass.
+Accepted tokens cost a fraction of a normal decode step. Rejected ones cost
+little, and greedy output is unchanged.
+
+    SPECULATIVE_DECODING=prompt_lookup   off (default) | prompt_lookup
+    SPEC_NUM_PRED_TOKENS=10              draft tokens proposed per step
+    SPEC_MAX_NGRAM_SIZE=2                longest n-gram matched against the prompt
+
+llama-cpp-python's high-level API has no separate draft-GGUF model, so
+prompt lookup is the only supported mode.
+"""
+import os
+from typing import Optional
+
+SPECULATIVE_MODES = ("off", "prompt_lookup")
+
+SPECULATIVE_DECODING = os.environ.get("SPECULATIVE_DECODING", "off")
+SPEC_NUM_PRED_TOKENS = int(os.environ.get("SPEC_NUM_PRED_TOKENS", "10"))
+SPEC_MAX_NGRAM_SIZE = int(os.environ.get("SPEC_MAX_NGRAM_SIZE", "2"))
+
+
+def make_draft_model(
+    mode: str = SPECULATIVE_DECODING,
+    num_pred_tokens: int = SPEC_NUM_PRED_TOKENS,
+    max_ngram_size: int = SPEC_MAX_NGRAM_SIZE,
+):
+    """Draft model for Llama(draft_model=...), or None when speculative decoding is off."""
+    if mode not in SPECULATIVE_MODES:
+        raise ValueError(f"Unknown SPECULATIVE_DECODING mode: {mode} (known: {', '.join(SPECULATIVE_MODES)})")
+    if mode == "off":
+        return None
+    from llama_cpp.llama_speculative import LlamaPromptLookupDecoding
+
+    return LlamaPromptLookupDecoding(num_pred_tokens=num_pred_tokens, max_ngram_size=max_ngram_size)
+
+
+def describe(mode: Optional[str] = None) -> dict:
+    mode = mode or SPECULATIVE_DECODING
+    if mode == "off":
+        return {"mode": "off"}
+    return {"mode": mode, "num_pred_tokens": SPEC_NUM_PRED_TOKENS, "max_ngram_size": SPEC_MAX_NGRAM_SIZE}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The service runs as flat modules from its own directory (see Dockerfile)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,100 @@
+import threading
+from contextlib import contextmanager
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("llama_cpp")
+
+import app  # noqa: E402
+from model_pool import ModelPool  # noqa: E402
+
+TRANSCRIPT = "The colt worked well this morning.\n\nHe heads to Flemington next week."
+
+
+class SpyCache:
+    def __init__(self):
+        self.gets = []
+        self.puts = []
+
+    def get(self, key):
+        self.gets.append(key)
+        return None
+
+    def put(self, key, value):
+        self.puts.append(key)
+
+    def note_bypass(self):
+        pass
+
+
+class FakeModel:
+    def n_ctx(self):
+        return 4096
+
+    def tokenize(self, data, add_bos=False, special=False):
+        return data.split()
+
+    def __call__(self, prompt, max_tokens, stop, stream=False, **sampling):
+        if stream:
+            return iter([{"choices": [{"text": "Refined."}]}])
+        return {
+            "choices": [{"text": "Refined.", "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        }
+
+
+class FakeRegistry:
+    def __init__(self):
+        self.pool = ModelPool(FakeModel, replicas=1)
+        for replica in self.pool.replicas:
+            replica.prefix_cache = None
+
+    def resolve(self, name=None):
+        return "fake.gguf"
+
+    def fingerprint(self, name=None):
+        return "0" * 64
+
+    @contextmanager
+    def use(self, name=None):
+        yield self.pool
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    spy = SpyCache()
+    monkeypatch.setattr(app, "registry", FakeRegistry())
+    monkeypatch.setattr(app, "refinement_cache", spy)
+    return spy
+
+
+def request(mode):
+    return app.RefineRequest(raw_text=TRANSCRIPT, incremental=True, mode=mode, model="fake.gguf")
+
+
+def test_creative_incremental_never_reads_or_writes_cache(cache):
+    creative = request("creative")
+    assert not app.use_incremental(creative)
+    assert app.lookup_cache(creative) == (None, None)
+
+    app.refine_blocking(creative)
+    events = []
+    app.refine_streaming(creative, "token", events.append, threading.Event())
+    app.store_paragraph(creative, "key", "Refined.")
+
+    assert events[-1]["type"] == "done"
+    assert "paragraphs" not in events[-1]
+    assert cache.gets == []
+    assert cache.puts == []
+
+
+def test_deterministic_incremental_caches_each_paragraph(cache):
+    deterministic = request("deterministic")
+    assert app.use_incremental(deterministic)
+
+    result = app.refine_incremental(deterministic)
+
+    assert result["paragraphs"]["total"] == 2
+    assert len(cache.gets) == 2
+    assert len(cache.puts) == 2
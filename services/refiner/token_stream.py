@@ -0,0 +1,74 @@
+"""
+Streaming helpers for the LLM Refiner.
+
+Generated text is emitted either per token or per sentence (tokens buffered
+until a sentence or line ends), as NDJSON lines or Server-Sent Events.
+The final "done" event carries the full text and usage stats.
+"""
+import json
+import re
+import time
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+STREAM_CHUNKS = ("token", "sentence")
+
+# End of a sentence (with any closing quote/bracket) followed by whitespace, or a line break
+_SENTENCE_END = re.compile(r"(?:[.!?][\"')\]]*\s+|\n+)")
+
+
+def encode_event(event: dict, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+
+class SentenceChunker:
+    """Buffers streamed tokens and releases whole sentences."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> list:
+        self._buffer += text
+        chunks = []
+        while True:
+            match = _SENTENCE_END.search(self._buffer)
+            if not match:
+                return chunks
+            chunks.append(self._buffer[:match.end()])
+            self._buffer = self._buffer[match.end():]
+
+    def flush(self) -> list:
+        rest, self._buffer = self._buffer, ""
+        return [rest] if rest else []
+
+
+class UsageMeter:
+    """Prompt/completion token counts and generation speed for one request."""
+
+    def __init__(self, prompt_tokens: int):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = 0
+        self.started = time.perf_counter()
+        self.first_token_at = None
+
+    def token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.completion_tokens += 1
+
+    def stats(self) -> dict:
+        finished = time.perf_counter()
+        # Generation speed excludes prompt evaluation (time to first token)
+        generating = finished - (self.first_token_at or finished)
+        return {
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "time_to_first_token": round((self.first_token_at or finished) - self.started, 3),
+            "seconds": round(finished - self.started, 3),
+            "tokens_per_second": round(self.completion_tokens / generating, 2) if generating > 0 else 0.0,
+        }
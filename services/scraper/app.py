@@ -5,6 +5,7 @@ Handles miStable report scraping and media processing
 import os
 from flask import Flask, request, jsonify
 from scraper_service import MiStableScraper, SupabaseUploader
+from cdn_selector import cdn_stats
 from supabase import create_client
 
 app = Flask(__name__)
@@ -33,6 +34,14 @@ def health_check():
     })
 
 
+@app.route('/cdn-stats', methods=['GET'])
+def cdn_stats_endpoint():
+    """Per-CDN throughput statistics gathered from probes and downloads"""
+    return jsonify({
+        "cdns": cdn_stats.all()
+    })
+
+
 @app.route('/scrape', methods=['POST'])
 def scrape_report():
     """
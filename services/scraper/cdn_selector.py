@@ -0,0 +1,290 @@
+"""
+Vimeo CDN Selector for Evolution Studios Engine
+Probes the HLS CDNs advertised in a Vimeo player config, picks the fastest
+and keeps per-CDN throughput statistics across downloads
+"""
+import os
+import json
+import time
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+from urllib.parse import urljoin
+import requests
+
+
+# Probe configuration
+CDN_PROBE_BYTES = int(os.environ.get("CDN_PROBE_BYTES", str(256 * 1024)))
+CDN_PROBE_TIMEOUT = float(os.environ.get("CDN_PROBE_TIMEOUT", "4"))
+CDN_STATS_PATH = os.environ.get("CDN_STATS_PATH", "/tmp/scraper_cdn_stats.json")
+
+# Weight of a fresh probe against the historical average (0..1)
+CDN_PROBE_WEIGHT = float(os.environ.get("CDN_PROBE_WEIGHT", "0.6"))
+# Smoothing factor for the exponentially weighted throughput average
+CDN_EWMA_ALPHA = float(os.environ.get("CDN_EWMA_ALPHA", "0.3"))
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+
+
+class CdnStats:
+    """
+    Persistent per-CDN throughput statistics
+    Stored as JSON so the history survives restarts and is shared by gunicorn workers.
+    Updates hold an exclusive flock on a sidecar lock file, so read-modify-write
+    cycles from different threads, instances and processes never overwrite each other
+    """
+
+    def __init__(self, path: str = CDN_STATS_PATH):
+        """
+        Initialize stats store
+
+        Args:
+            path: JSON file used to persist statistics
+        """
+        self.path = path
+        self.lock_path = f"{path}.lock"
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _exclusive(self):
+        # The thread lock orders this process's threads; flock orders processes
+        with self._lock, open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, stats: Dict[str, Dict[str, Any]]):
+        tmp_path = None
+        try:
+            # Unique temp file, then an atomic rename: readers never see a partial file
+            with tempfile.NamedTemporaryFile(
+                'w',
+                dir=os.path.dirname(self.path) or '.',
+                prefix=f"{os.path.basename(self.path)}.",
+                suffix='.tmp',
+                delete=False
+            ) as f:
+                tmp_path = f.name
+                json.dump(stats, f, indent=2, sort_keys=True)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠ Could not persist CDN stats: {e}")
+            if tmp_path and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def record(self, cdn_name: str, throughput_bps: Optional[float], source: str = "probe"):
+        """
+        Record a throughput sample (or a failure) for a CDN
+
+        Args:
+            cdn_name: CDN key from the player config
+            throughput_bps: Measured throughput in bytes/second, None on failure
+            source: "probe" or "download"
+        """
+        with self._exclusive():
+            stats = self._load()
+            entry = stats.setdefault(cdn_name, {
+                'ewma_bps': None,
+                'samples': 0,
+                'failures': 0,
+                'last_bps': None,
+                'last_source': None,
+                'last_seen': None
+            })
+
+            if throughput_bps is None:
+                entry['failures'] += 1
+            else:
+                previous = entry['ewma_bps']
+                entry['ewma_bps'] = throughput_bps if previous is None else (
+                    CDN_EWMA_ALPHA * throughput_bps + (1 - CDN_EWMA_ALPHA) * previous
+                )
+                entry['samples'] += 1
+                entry['last_bps'] = throughput_bps
+
+            entry['last_source'] = source
+            entry['last_seen'] = datetime.utcnow().isoformat()
+            self._save(stats)
+
+    def get(self, cdn_name: str) -> Optional[Dict[str, Any]]:
+        """Return the statistics entry for a CDN, if any"""
+        return self._load().get(cdn_name)
+
+    def all(self) -> Dict[str, Dict[str, Any]]:
+        """Return statistics for every CDN seen so far"""
+        return self._load()
+
+
+# One store per process; use this rather than creating new CdnStats instances
+cdn_stats = CdnStats()
+
+
+class CdnSelector:
+    """
+    Picks the fastest HLS CDN for a Vimeo video
+    Each advertised CDN is probed concurrently with a small ranged segment fetch;
+    the fresh measurement is blended with the historical average
+    """
+
+    def __init__(self, stats: Optional[CdnStats] = None):
+        """
+        Initialize selector
+
+        Args:
+            stats: Statistics store (defaults to the shared JSON store)
+        """
+        self.stats = stats or cdn_stats
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': USER_AGENT,
+            'Referer': 'https://mistable.com/'
+        })
+
+    def select(self, hls_files: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        """
+        Select the best CDN from a player config's `request.files.hls` block
+
+        Args:
+            hls_files: The `hls` dict containing `cdns` and optionally `default_cdn`
+
+        Returns:
+            Tuple of (cdn_name, hls_url), or None if no CDN is usable
+        """
+        cdns = {
+            name: cdn['url']
+            for name, cdn in hls_files.get('cdns', {}).items()
+            if isinstance(cdn, dict) and cdn.get('url')
+        }
+        if not cdns:
+            return None
+
+        if len(cdns) == 1:
+            name, url = next(iter(cdns.items()))
+            return name, url
+
+        print(f"→ Probing {len(cdns)} CDNs: {', '.join(cdns)}")
+        with ThreadPoolExecutor(max_workers=len(cdns)) as pool:
+            probes = dict(zip(cdns, pool.map(self.probe, cdns.values())))
+
+        for name, throughput in probes.items():
+            self.stats.record(name, throughput, source="probe")
+
+        ranked = self._rank(cdns, probes, hls_files.get('default_cdn'))
+        for name, score in ranked:
+            label = f"{score / 1024:.0f} KiB/s" if score else "no data"
+            print(f"  {name}: {label}")
+
+        best = ranked[0][0]
+        print(f"✓ Selected CDN: {best}")
+        return best, cdns[best]
+
+    def _rank(
+        self,
+        cdns: Dict[str, str],
+        probes: Dict[str, Optional[float]],
+        default_cdn: Optional[str]
+    ) -> List[Tuple[str, float]]:
+        """
+        Rank CDNs by blended score (fresh probe + historical EWMA)
+        CDNs without any data fall back to the player's default ordering
+        """
+        scored = []
+        for name in cdns:
+            history = (self.stats.get(name) or {}).get('ewma_bps')
+            probe = probes.get(name)
+
+            if probe is not None and history is not None:
+                score = CDN_PROBE_WEIGHT * probe + (1 - CDN_PROBE_WEIGHT) * history
+            elif probe is not None:
+                score = probe
+            elif history is not None:
+                # Probe failed this time: keep the CDN but penalise it heavily
+                score = history * 0.1
+            else:
+                score = 0.0
+
+            scored.append((name, score, name == default_cdn))
+
+        scored.sort(key=lambda item: (item[1], item[2]), reverse=True)
+        return [(name, score) for name, score, _ in scored]
+
+    def probe(self, hls_url: str) -> Optional[float]:
+        """
+        Measure throughput of a CDN by fetching the first bytes of its first media segment
+
+        Args:
+            hls_url: Master playlist URL for the CDN
+
+        Returns:
+            Throughput in bytes/second (including connection setup), None on failure
+        """
+        started = time.monotonic()
+        try:
+            segment_url = self._first_segment_url(hls_url)
+            target = segment_url or hls_url
+            received = 0
+
+            with self.session.get(
+                target,
+                headers={'Range': f'bytes=0-{CDN_PROBE_BYTES - 1}'},
+                stream=True,
+                timeout=CDN_PROBE_TIMEOUT
+            ) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=16 * 1024):
+                    received += len(chunk)
+                    if received >= CDN_PROBE_BYTES:
+                        break
+                    if time.monotonic() - started > CDN_PROBE_TIMEOUT:
+                        break
+
+            elapsed = time.monotonic() - started
+            if received == 0 or elapsed <= 0:
+                return None
+            return received / elapsed
+
+        except Exception as e:
+            print(f"⚠ CDN probe failed for {hls_url[:80]}: {e}")
+            return None
+
+    def _first_segment_url(self, playlist_url: str, depth: int = 0) -> Optional[str]:
+        """
+        Walk master -> media playlist and return the first media segment URL
+        The EXT-X-MAP init segment is skipped: it is a few KiB, so timing it measures
+        latency rather than throughput.
+        Vimeo playlists may be standard M3U8 or JSON; unknown formats return None
+        """
+        response = self.session.get(playlist_url, timeout=CDN_PROBE_TIMEOUT)
+        response.raise_for_status()
+        text = response.text
+
+        if not text.lstrip().startswith('#EXTM3U'):
+            return None
+
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+        is_master = any(line.startswith('#EXT-X-STREAM-INF') for line in lines)
+
+        for line in lines:
+            if line.startswith('#'):
+                continue
+            uri = urljoin(playlist_url, line)
+            if is_master:
+                if depth >= 1:
+                    return None
+                return self._first_segment_url(uri, depth + 1)
+            return uri
+
+        return None
@@ -7,6 +7,7 @@ import re
 import json
 import tempfile
 import shutil
+import time
 from pathlib import Path
 from typing import Dict, List, Optional, Any
 from datetime import datetime
@@ -14,6 +15,11 @@ import requests
 from bs4 import BeautifulSoup
 import yt_dlp
 import ffmpeg
+from cdn_selector import CdnSelector
+
+
+# Number of HLS/DASH fragments yt-dlp fetches in parallel
+HLS_CONCURRENT_FRAGMENTS = int(os.environ.get("HLS_CONCURRENT_FRAGMENTS", "8"))
 
 
 class MiStableScraper:
@@ -25,6 +31,7 @@ class MiStableScraper:
     def __init__(self):
         """Initialize scraper with temporary directory"""
         self.temp_dir = tempfile.mkdtemp(prefix="mistable_")
+        self.cdn_selector = CdnSelector()
         print(f"✓ Scraper initialized with temp dir: {self.temp_dir}")
     
     def scrape_report(self, source_url: str, job_id: str) -> Dict[str, Any]:
@@ -318,18 +325,16 @@ class MiStableScraper:
         config = self._extract_vimeo_config(video_url)
         if config:
             try:
-                # Get HLS URL from config
+                # Get HLS URL from config, picking the fastest advertised CDN
                 hls_url = None
+                cdn_name = None
                 if 'request' in config and 'files' in config['request']:
                     files = config['request']['files']
                     if 'hls' in files and 'cdns' in files['hls']:
-                        cdns = files['hls']['cdns']
-                        # Try akfire_interconnect_quic first, then fastly_skyfire
-                        for cdn_name in ['akfire_interconnect_quic', 'fastly_skyfire']:
-                            if cdn_name in cdns and 'url' in cdns[cdn_name]:
-                                hls_url = cdns[cdn_name]['url']
-                                print(f"✓ Found HLS URL from {cdn_name}")
-                                break
+                        selected = self.cdn_selector.select(files['hls'])
+                        if selected:
+                            cdn_name, hls_url = selected
+                            print(f"✓ Found HLS URL from {cdn_name}")
                 
                 if hls_url:
                     # Download using yt-dlp with HLS URL
@@ -342,15 +347,18 @@ class MiStableScraper:
                         'format': 'best',
                         'outtmpl': output_template,
                         'quiet': False,
+                        'concurrent_fragment_downloads': HLS_CONCURRENT_FRAGMENTS,
                         'http_headers': {
                             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                             'Referer': 'https://mistable.com/'
                         }
                     }
                     
+                    started = time.monotonic()
                     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
                         info = ydl.extract_info(hls_url, download=True)
                         filename = ydl.prepare_filename(info)
+                    self._record_download(cdn_name, filename, time.monotonic() - started)
                     
                     print(f"✓ Downloaded via HLS: {filename}")
                     return filename
@@ -371,6 +379,7 @@ class MiStableScraper:
                 'quiet': False,
                 'no_warnings': False,
                 'extract_flat': False,
+                'concurrent_fragment_downloads': HLS_CONCURRENT_FRAGMENTS,
                 'http_headers': {
                     'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
                     'Referer': 'https://mistable.com/'
@@ -388,6 +397,25 @@ class MiStableScraper:
             print(f"✗ Failed to download video {video_index}: {e}")
             return None
     
+    def _record_download(self, cdn_name: str, filename: str, elapsed: float):
+        """
+        Feed the real download throughput back into the CDN statistics
+        
+        Args:
+            cdn_name: CDN the video was downloaded from
+            filename: Downloaded file path
+            elapsed: Wall time of the download in seconds
+        """
+        try:
+            size = os.path.getsize(filename)
+        except OSError:
+            return
+        
+        if elapsed > 0 and size > 0:
+            throughput = size / elapsed
+            self.cdn_selector.stats.record(cdn_name, throughput, source="download")
+            print(f"✓ {cdn_name}: {size / 1024 / 1024:.1f} MiB in {elapsed:.1f}s ({throughput / 1024 / 1024:.2f} MiB/s)")
+    
     def _extract_audio(self, video_path: str) -> Optional[str]:
         """
         Extract audio from video using FFmpeg
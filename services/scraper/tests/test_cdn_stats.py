@@ -0,0 +1,22 @@
+import pytest
+
+for module in ("flask", "supabase", "bs4", "yt_dlp", "ffmpeg"):
+    pytest.importorskip(module)
+
+import app  # noqa: E402
+from cdn_selector import cdn_stats  # noqa: E402
+
+
+def test_cdn_stats_endpoint(tmp_path, monkeypatch):
+    # Point the shared store at a scratch file; the endpoint must read this same store
+    path = str(tmp_path / "cdn_stats.json")
+    monkeypatch.setattr(cdn_stats, "path", path)
+    monkeypatch.setattr(cdn_stats, "lock_path", f"{path}.lock")
+    cdn_stats.record("vimeocdn.com", 4_000_000.0, source="probe")
+
+    response = app.app.test_client().get("/cdn-stats")
+
+    assert response.status_code == 200
+    entry = response.get_json()["cdns"]["vimeocdn.com"]
+    assert entry["samples"] == 1
+    assert entry["last_bps"] == 4_000_000.0
@@ -1,64 +1,502 @@
+import asyncio
+import json
 import os
+import threading
+import time
+from functools import partial
+from typing import Optional
 from fastapi import FastAPI, UploadFile, File
-from faster_whisper import WhisperModel
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+from audio_source import AudioSourceError, resolve_source, spool_upload
+from batching import (
+    BATCH_LANGUAGE, BATCH_MAX_REQUESTS, BATCH_MAX_WAIT_MS, BATCHING_ENABLED, BatchingEngine, batch_options,
+    transcribe_batch_with
+)
+from long_audio import LONG_AUDIO_THRESHOLD_SECONDS, probe_duration, transcribe_long
+from inference_queue import INFERENCE_CONCURRENCY, InferenceQueue, QueueFullError, TicketCancelled
+from model_registry import ModelRegistry, ModelRouter, UnknownModelError
+from replicas import WHISPER_REPLICAS, ReplicaPool
+from transcript_cache import TRANSCRIPT_CACHE_ENABLED, TranscriptCache, cache_key
+from whisper_engine import (
+    DECODING_PROFILES, DEFAULT_PROFILE, UnknownProfileError, config_from_env, detect_language, profile_options,
+    stream_segments, transcribe_file, transcribe_segments
+)
 
-# Configuration from environment variables
-WHISPER_MODEL = os.environ.get("WHISPER_MODEL", "large-v3")
-COMPUTE_TYPE = os.environ.get("COMPUTE_TYPE", "int8")
-DEVICE = "cuda"  # Use GPU
+# Configuration from environment variables (device / compute-type matrix)
+ENGINE_CONFIG = config_from_env()
+WHISPER_MODEL = ENGINE_CONFIG.model_name
+DEVICE = ENGINE_CONFIG.device
+STARTUP_RETRY_AFTER = int(os.environ.get("STARTUP_RETRY_AFTER", "30"))
 
 app = FastAPI()
-model = None
+# In-process models (single replica); loaded lazily apart from the default
+registry = ModelRegistry(ENGINE_CONFIG)
+replicas = None   # Replica worker processes when WHISPER_REPLICAS > 1
+router = None
+batchers = {}     # (model, decoding profile) -> BatchingEngine, created on first use
+transcript_cache = None
+
+# Whisper runs on a dedicated executor behind a bounded queue, never on the event loop.
+# With replicas, each queue slot is a thread that dispatches to a replica process.
+inference_queue = InferenceQueue(
+    concurrency=WHISPER_REPLICAS if WHISPER_REPLICAS > 1 else INFERENCE_CONCURRENCY
+)
+
+# Reference to audio the caller has already stored (Supabase Storage, shared volume or URL)
+class TranscribeReference(BaseModel):
+    source: str
+    bucket: Optional[str] = None
+    long_audio: Optional[bool] = None
+    cache_bypass: bool = False
+    # Quality tier (see ROUTE_TIERS) or an explicit model from WHISPER_MODELS
+    tier: Optional[str] = None
+    model: Optional[str] = None
+    # Decoding profile: fast | accurate (see DECODING_PROFILES)
+    profile: Optional[str] = None
+
+# Startup timing report, served on /ready and /health
+startup = {"state": "starting", "phases": {}, "total_seconds": None, "error": None}
 
-@app.on_event("startup")
 def load_whisper_model():
-    global model
+    global replicas, router, transcript_cache
+    started = time.monotonic()
+    phases = startup["phases"]
     try:
-        print(f"Loading Faster-Whisper model: {WHISPER_MODEL} with compute type: {COMPUTE_TYPE}")
-        model = WhisperModel(
-            WHISPER_MODEL,
-            device=DEVICE,
-            compute_type=COMPUTE_TYPE
-        )
-        print(f"Whisper model loaded successfully on GPU")
+        if TRANSCRIPT_CACHE_ENABLED:
+            phase_started = time.monotonic()
+            try:
+                transcript_cache = TranscriptCache()
+                print(f"Transcript cache: {transcript_cache.path} ({transcript_cache.stats()['entries']} entries)")
+            except Exception as e:
+                print(f"WARNING: transcript cache unavailable: {e}")
+            phases["transcript_cache"] = round(time.monotonic() - phase_started, 2)
+
+        print(f"Loading Faster-Whisper model: {WHISPER_MODEL} on {DEVICE} "
+              f"with compute type: {ENGINE_CONFIG.compute_type}")
+        model_router = ModelRouter(registry.names, WHISPER_MODEL)
+        if WHISPER_REPLICAS > 1:
+            phase_started = time.monotonic()
+            pool = ReplicaPool(ENGINE_CONFIG)
+            pool.start()
+            # Replicas load in parallel; per-replica load and warm-up timings are in /health
+            phases["replicas"] = round(time.monotonic() - phase_started, 2)
+            replicas = pool
+        else:
+            # Load time includes checksum verification of the cached model files
+            timings = registry.preload()
+            phases["model_load"] = timings["load_seconds"]
+            phases["warmup"] = timings["warmup_seconds"]
+        router = model_router
+        startup["state"] = "ready"
+        print(f"Whisper model loaded successfully on {DEVICE} in {time.monotonic() - started:.1f}s "
+              f"({WHISPER_REPLICAS} replica(s)); available models: {', '.join(registry.names)}")
+        if BATCHING_ENABLED:
+            print(f"Dynamic batching enabled (max {BATCH_MAX_REQUESTS} requests, {BATCH_MAX_WAIT_MS}ms window, per model)")
     except Exception as e:
+        startup["state"] = "failed"
+        startup["error"] = str(e)
         print(f"FATAL ERROR loading Whisper model: {e}")
+    finally:
+        startup["total_seconds"] = round(time.monotonic() - started, 2)
+        print(f"Startup report: {json.dumps(startup)}")
 
-@app.post("/transcribe")
-async def transcribe_audio(file: UploadFile = File(...)):
-    if not model:
-        return {"error": "Whisper model not loaded"}, 500
-    
+@app.on_event("startup")
+def start_model_loading():
+    # Load in the background so /live answers while the model loads; /ready gates traffic
+    threading.Thread(target=load_whisper_model, name="whisper-startup", daemon=True).start()
+
+@app.on_event("shutdown")
+def stop_replicas():
+    if replicas:
+        replicas.shutdown()
+
+def model_ready() -> bool:
+    return startup["state"] == "ready"
+
+def not_ready_response() -> JSONResponse:
+    if startup["state"] == "failed":
+        return error_response(f"Whisper model failed to load: {startup['error']}", 503)
+    return error_response("Whisper model not loaded", 503, retry_after=STARTUP_RETRY_AFTER)
+
+def get_batcher(model_name: str, profile: str) -> Optional[BatchingEngine]:
+    # Requests are only batched together when they share a model and decoding profile
+    if not BATCHING_ENABLED:
+        return None
+    if (model_name, profile) not in batchers:
+        if replicas:
+            run_batch = partial(replicas.transcribe_batch, model_name=model_name, profile=profile)
+        else:
+            run_batch = partial(transcribe_batch_with, registry, model_name, profile)
+        batchers[model_name, profile] = BatchingEngine(inference_queue, run_batch)
+    return batchers[model_name, profile]
+
+def batching_stats() -> dict:
+    if not BATCHING_ENABLED:
+        return {"enabled": False}
+    return {
+        "enabled": True,
+        "engines": {f"{name}/{profile}": engine.stats() for (name, profile), engine in batchers.items()}
+    }
+
+def error_response(message: str, status_code: int = 500, retry_after: Optional[int] = None) -> JSONResponse:
+    content = {"error": message}
+    headers = None
+    if retry_after is not None:
+        content["retry_after"] = retry_after
+        headers = {"Retry-After": str(retry_after)}
+    return JSONResponse(status_code=status_code, content=content, headers=headers)
+
+def is_long_audio(duration: Optional[float], long_audio: Optional[bool]) -> bool:
+    if long_audio is None:
+        return duration is not None and duration >= LONG_AUDIO_THRESHOLD_SECONDS
+    return long_audio
+
+def detect_path_language(path: str, model_name: str) -> tuple:
+    if replicas:
+        return replicas.detect_language(path, model_name)
+    with registry.use(model_name) as whisper:
+        return detect_language(whisper, path)
+
+def transcribe_chunk_with(model_name: str, profile: str, audio) -> tuple:
+    with registry.use(model_name) as whisper:
+        return transcribe_segments(whisper, audio, profile)
+
+def transcribe_path(path: str, model_name: str, profile: str, long_audio: bool) -> dict:
+    # Blocking: runs on the inference executor
+    if long_audio:
+        # Split on VAD boundaries and fan chunks out across replicas / model workers
+        if replicas:
+            chunk_transcriber = partial(replicas.transcribe_segments, model_name=model_name, profile=profile)
+            return transcribe_long(path, chunk_transcriber, replicas.size)
+        return transcribe_long(path, partial(transcribe_chunk_with, model_name, profile), ENGINE_CONFIG.num_workers)
+
+    if replicas:
+        return replicas.transcribe(path, model_name, profile)
+    with registry.use(model_name) as whisper:
+        return transcribe_file(whisper, path, profile)
+
+async def route_request(audio, tier: Optional[str], model_name: Optional[str]) -> tuple:
+    """Returns (model name, routing reason, duration). Raises UnknownModelError."""
+    duration = await run_in_threadpool(probe_duration, audio.path)
+    # Language detection (when enabled) decodes 30 seconds with a small model, off the inference queue
+    chosen, reason = await run_in_threadpool(
+        router.route, duration, tier, model_name, partial(detect_path_language, audio.path)
+    )
+    return chosen, reason, duration
+
+def decoding_options(model_name: str, profile: str, batched: bool) -> dict:
+    # Everything that changes the transcript for identical audio
+    if batched:
+        options = {**batch_options(profile), "language": BATCH_LANGUAGE}
+    else:
+        options = profile_options(profile)
+    return {
+        "model": model_name,
+        "compute_type": ENGINE_CONFIG.compute_type,
+        "profile": profile,
+        **options,
+    }
+
+async def lookup_cache(audio, model_name: str, profile: str, batched: bool, bypass: bool):
+    """Returns (cache key, cached result or None). The key is None when caching is off."""
+    if not transcript_cache:
+        return None, None
+    audio_sha256 = audio.sha256 or await run_in_threadpool(audio.ensure_sha256)
+    key = cache_key(audio_sha256, decoding_options(model_name, profile, batched))
+    if bypass:
+        transcript_cache.note_bypass()
+        return key, None
+    return key, transcript_cache.get(key)
+
+async def queued_transcription(
+    acquire_audio,
+    long_audio: Optional[bool] = None,
+    cache_bypass: bool = False,
+    tier: Optional[str] = None,
+    model_name: Optional[str] = None,
+    profile: Optional[str] = None
+) -> JSONResponse | dict:
+    if not model_ready():
+        return not_ready_response()
+
+    audio = None
+    ticket = None
     try:
-        # Save uploaded file temporarily
-        temp_path = f"/tmp/{file.filename}"
-        with open(temp_path, "wb") as f:
-            content = await file.read()
-            f.write(content)
-        
-        # Transcribe
-        segments, info = model.transcribe(temp_path, beam_size=5)
-        
-        # Collect results
-        transcription = " ".join([segment.text for segment in segments])
-        
-        # Clean up temp file
-        os.remove(temp_path)
-        
-        return {
-            "status": "success",
-            "transcription": transcription,
-            "language": info.language,
-            "duration": info.duration
-        }
+        profile = profile or DEFAULT_PROFILE
+        profile_options(profile)
+        audio = await acquire_audio()
+        model_name, route, duration = await route_request(audio, tier, model_name)
+        routing = {"model": model_name, "route": route, "profile": profile}
+        batcher = get_batcher(model_name, profile)
+        if batcher and long_audio is None:
+            # The batched pipeline already decodes a long file's VAD clips in parallel GPU batches,
+            # so duration-based long-audio chunking only applies when batching is off
+            long_audio = False
+        long_audio = is_long_audio(duration, long_audio)
+        if long_audio:
+            # Requested explicitly: VAD chunks fan out across replicas / model workers instead
+            batcher = None
+
+        # Identical audio + decoding parameters never needs a queue slot
+        key, cached = await lookup_cache(audio, model_name, profile, batcher is not None, cache_bypass)
+        if cached:
+            cached.pop("segments", None)
+            return {**cached, **routing, "cache": {"hit": True}}
+
+        try:
+            ticket = inference_queue.admit()
+        except QueueFullError as e:
+            return error_response("Transcription queue is full", 429, retry_after=e.retry_after)
+
+        if batcher:
+            result = await batcher.submit(ticket, audio.path)
+        else:
+            result = await inference_queue.run(ticket, transcribe_path, audio.path, model_name, profile, long_audio)
+        if key:
+            transcript_cache.put(key, result)
+        # Segments are cached for stream replays; /transcribe responses carry only the text
+        result.pop("segments", None)
+        result.update(routing)
+        result["queue"] = ticket.summary()
+        result["cache"] = {"hit": False, "bypassed": cache_bypass}
+        return result
+    except AudioSourceError as e:
+        return error_response(str(e), e.status_code)
+    except (UnknownModelError, UnknownProfileError) as e:
+        return error_response(str(e), 400)
+    except TicketCancelled:
+        return error_response("Request cancelled before inference started", 499)
     except Exception as e:
-        return {"error": str(e)}, 500
+        return error_response(str(e))
+    finally:
+        if ticket:
+            inference_queue.release(ticket)
+        if audio:
+            audio.cleanup()
+
+@app.post("/transcribe")
+async def transcribe_audio(
+    file: UploadFile = File(...),
+    long_audio: Optional[bool] = None,
+    cache_bypass: bool = False,
+    tier: Optional[str] = None,
+    model: Optional[str] = None,
+    profile: Optional[str] = None
+):
+    # Stream the upload to a unique spool file
+    return await queued_transcription(lambda: spool_upload(file), long_audio, cache_bypass, tier, model, profile)
+
+@app.post("/transcribe/reference")
+async def transcribe_reference(reference: TranscribeReference):
+    # Read stored audio directly instead of having callers re-upload it
+    async def acquire():
+        return await run_in_threadpool(resolve_source, reference.source, reference.bucket)
+
+    result = await queued_transcription(
+        acquire, reference.long_audio, reference.cache_bypass, reference.tier, reference.model, reference.profile
+    )
+    if isinstance(result, dict):
+        result["source"] = reference.source
+    return result
+
+def stream_path(path: str, model_name: str, profile: str, emit, stop: threading.Event) -> int:
+    # Blocking: runs on the inference executor, emitting events as segments decode
+    if replicas:
+        return replicas.stream(path, model_name, profile, emit, stop)
+    with registry.use(model_name) as whisper:
+        return stream_segments(whisper, path, emit, stop.is_set, profile)
+
+STREAM_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "sse": "text/event-stream",
+}
+
+def encode_event(event: dict, fmt: str) -> str:
+    if fmt == "sse":
+        return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+    return json.dumps(event) + "\n"
+
+async def streaming_transcription(
+    acquire_audio,
+    fmt: str,
+    cache_bypass: bool = False,
+    tier: Optional[str] = None,
+    model_name: Optional[str] = None,
+    profile: Optional[str] = None
+):
+    if fmt not in STREAM_MEDIA_TYPES:
+        return error_response(f"Unsupported stream format: {fmt}", 400)
+    if not model_ready():
+        return not_ready_response()
+    profile = profile or DEFAULT_PROFILE
+    try:
+        profile_options(profile)
+    except UnknownProfileError as e:
+        return error_response(str(e), 400)
+
+    try:
+        audio = await acquire_audio()
+    except AudioSourceError as e:
+        return error_response(str(e), e.status_code)
+
+    try:
+        model_name, route, _ = await route_request(audio, tier, model_name)
+        key, cached = await lookup_cache(audio, model_name, profile, False, cache_bypass)
+        if cached and "segments" not in cached:
+            # Written before results kept their segments; a replay would have no segment events
+            cached = None
+    except UnknownModelError as e:
+        audio.cleanup()
+        return error_response(str(e), 400)
+    except Exception:
+        audio.cleanup()
+        raise
+    routing = {"model": model_name, "route": route, "profile": profile}
+    if cached:
+        audio.cleanup()
+        return StreamingResponse(replay_cached(cached, fmt, routing), media_type=STREAM_MEDIA_TYPES[fmt])
+
+    try:
+        ticket = inference_queue.admit()
+    except QueueFullError as e:
+        audio.cleanup()
+        return error_response("Transcription queue is full", 429, retry_after=e.retry_after)
+
+    loop = asyncio.get_running_loop()
+    events = asyncio.Queue()
+    stop = threading.Event()
+    texts = []
+    collected = {"segments": []}
+
+    def emit(event: dict):
+        # Called from the inference thread
+        if event["type"] == "segment":
+            texts.append(event["text"])
+            collected["segments"].append({k: v for k, v in event.items() if k not in ("type", "index")})
+        elif event["type"] == "info":
+            collected.update(language=event["language"], duration=event["duration"])
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def produce():
+        try:
+            count = await inference_queue.run(ticket, stream_path, audio.path, model_name, profile, emit, stop)
+            if key and not stop.is_set():
+                # Only complete transcripts are cached
+                transcript_cache.put(key, {
+                    "status": "success",
+                    "transcription": " ".join(texts),
+                    **collected,
+                })
+            events.put_nowait({
+                "type": "done",
+                "segments": count,
+                "transcription": " ".join(texts),
+                **routing,
+                "queue": ticket.summary(),
+            })
+        except TicketCancelled:
+            events.put_nowait({"type": "error", "error": "Request cancelled before inference started"})
+        except Exception as e:
+            events.put_nowait({"type": "error", "error": str(e)})
+        finally:
+            inference_queue.release(ticket)
+            audio.cleanup()
+            events.put_nowait(None)
+
+    # Started now, not when the body is first read, so cleanup runs even if the client never reads
+    producer = asyncio.ensure_future(produce())
+
+    async def body():
+        try:
+            yield encode_event({"type": "queued", **routing, "queue": ticket.summary()}, fmt)
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield encode_event(event, fmt)
+        finally:
+            # Client went away or stream finished: stop decoding further segments
+            stop.set()
+            if not producer.done():
+                inference_queue.release(ticket)
+
+    return StreamingResponse(body(), media_type=STREAM_MEDIA_TYPES[fmt])
+
+async def replay_cached(cached: dict, fmt: str, routing: dict):
+    yield encode_event({
+        "type": "info",
+        "language": cached.get("language"),
+        "duration": cached.get("duration"),
+        "cache": {"hit": True},
+    }, fmt)
+    segments = cached.get("segments") or []
+    for index, segment in enumerate(segments):
+        yield encode_event({"type": "segment", "index": index, **segment}, fmt)
+    yield encode_event({
+        "type": "done",
+        "segments": len(segments),
+        "transcription": cached["transcription"],
+        **routing,
+        "cache": {"hit": True},
+    }, fmt)
+
+@app.post("/transcribe/stream")
+async def transcribe_audio_stream(
+    file: UploadFile = File(...),
+    format: str = "ndjson",
+    cache_bypass: bool = False,
+    tier: Optional[str] = None,
+    model: Optional[str] = None,
+    profile: Optional[str] = None
+):
+    # Segments are emitted as soon as they are decoded (NDJSON or SSE)
+    return await streaming_transcription(lambda: spool_upload(file), format, cache_bypass, tier, model, profile)
+
+@app.post("/transcribe/reference/stream")
+async def transcribe_reference_stream(reference: TranscribeReference, format: str = "ndjson"):
+    async def acquire():
+        return await run_in_threadpool(resolve_source, reference.source, reference.bucket)
+
+    return await streaming_transcription(
+        acquire, format, reference.cache_bypass, reference.tier, reference.model, reference.profile
+    )
+
+@app.get("/queue")
+def queue_status():
+    return {
+        **inference_queue.stats(),
+        "batching": batching_stats()
+    }
+
+@app.get("/live")
+def liveness():
+    # The process is up and serving HTTP; says nothing about the model
+    return {"status": "alive"}
+
+@app.get("/ready")
+def readiness():
+    # Only route traffic here once the model is loaded and warmed up
+    if model_ready():
+        return {"status": "ready", "startup": startup}
+    headers = {"Retry-After": str(STARTUP_RETRY_AFTER)} if startup["state"] == "starting" else None
+    return JSONResponse(status_code=503, content={"status": startup["state"], "startup": startup}, headers=headers)
 
 @app.get("/health")
 def health_check():
-    return {
-        "status": "ok",
+    return JSONResponse(status_code=200 if model_ready() else 503, content={
+        "status": "ok" if model_ready() else startup["state"],
         "model": WHISPER_MODEL,
         "device": DEVICE,
-        "model_loaded": model is not None
-    }
\ No newline at end of file
+        "engine": ENGINE_CONFIG.describe(),
+        "decoding_profiles": {"default": DEFAULT_PROFILE, "available": sorted(DECODING_PROFILES)},
+        "model_loaded": model_ready(),
+        "replicas": replicas.stats() if replicas else None,
+        "models": None if replicas else registry.stats(),
+        "routing": router.stats() if router else None,
+        "queue": inference_queue.stats(),
+        "batching": batching_stats(),
+        "cache": transcript_cache.stats() if transcript_cache else {"enabled": False},
+        "startup": startup
+    })
@@ -0,0 +1,199 @@
+"""
+Audio input handling for the Transcriber service.
+
+Uploads are streamed to uniquely named spool files in fixed-size chunks so
+memory stays flat regardless of file size. Audio that already lives in
+Supabase Storage, on a shared volume or behind a URL is read directly
+instead of being pushed through the API a second time.
+"""
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from fastapi import UploadFile
+
+SPOOL_DIR = os.environ.get("SPOOL_DIR", "/tmp/transcriber_spool")
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_AUDIO_BYTES = int(os.environ.get("MAX_AUDIO_BYTES", str(2 * 1024 * 1024 * 1024)))
+DOWNLOAD_TIMEOUT = float(os.environ.get("DOWNLOAD_TIMEOUT", "60"))
+
+# Directories (comma separated) that may be read directly, e.g. the scratch volume
+SHARED_AUDIO_DIRS = [
+    os.path.realpath(p.strip())
+    for p in os.environ.get("SHARED_AUDIO_DIRS", "/app/input").split(",")
+    if p.strip()
+]
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL", "").rstrip("/")
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+STORAGE_PREFIXES = ("supabase://storage/", "storage://")
+
+
+class AudioSourceError(Exception):
+    """Raised when an audio source cannot be read; carries the HTTP status to return."""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+@dataclass
+class SpooledAudio:
+    """A readable audio file on local disk. Owned files are deleted by cleanup()."""
+    path: str
+    owned: bool = True
+    # Content hash, computed on the fly while spooling; see ensure_sha256()
+    sha256: Optional[str] = None
+
+    def ensure_sha256(self) -> str:
+        if self.sha256 is None:
+            digest = hashlib.sha256()
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+            self.sha256 = digest.hexdigest()
+        return self.sha256
+
+    def cleanup(self):
+        if self.owned:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def new_spool_path(name_hint: Optional[str] = None) -> str:
+    """Unique spool path; keeps the extension of name_hint so ffmpeg can sniff the container."""
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    ext = os.path.splitext(name_hint or "")[1].lower()
+    if not ext.isascii() or len(ext) > 8:
+        ext = ""
+    return os.path.join(SPOOL_DIR, f"{uuid.uuid4().hex}{ext}")
+
+
+async def spool_upload(file: UploadFile) -> SpooledAudio:
+    """Stream an upload to a unique spool file in UPLOAD_CHUNK_SIZE chunks."""
+    spooled = SpooledAudio(new_spool_path(file.filename))
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(spooled.path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > MAX_AUDIO_BYTES:
+                    raise AudioSourceError(f"Upload exceeds {MAX_AUDIO_BYTES} bytes", 413)
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        spooled.cleanup()
+        raise
+    finally:
+        await file.close()
+
+    if written == 0:
+        spooled.cleanup()
+        raise AudioSourceError("Uploaded file is empty")
+    spooled.sha256 = digest.hexdigest()
+    return spooled
+
+
+def resolve_source(source: str, bucket: Optional[str] = None) -> SpooledAudio:
+    """
+    Turn an audio reference into a local file. Blocking; run it off the event loop.
+
+    Accepted forms:
+      - http(s) URL                           -> streamed to a spool file
+      - supabase://storage/<bucket>/<path>    -> downloaded from Supabase Storage
+      - <path> with an explicit bucket        -> downloaded from Supabase Storage
+      - absolute path under SHARED_AUDIO_DIRS -> read in place, never copied
+    """
+    source = source.strip()
+    if not source:
+        raise AudioSourceError("Empty audio source")
+
+    if source.startswith(("http://", "https://")):
+        return _download(source, _auth_headers_for(source))
+
+    for prefix in STORAGE_PREFIXES:
+        if source.startswith(prefix):
+            return _download_storage_object(source[len(prefix):], bucket)
+
+    if bucket:
+        return _download_storage_object(source, bucket)
+
+    if os.path.isabs(source):
+        return _open_shared_path(source)
+
+    raise AudioSourceError(f"Unrecognised audio source: {source}")
+
+
+def _open_shared_path(path: str) -> SpooledAudio:
+    real_path = os.path.realpath(path)
+    if not any(real_path == root or real_path.startswith(root + os.sep) for root in SHARED_AUDIO_DIRS):
+        raise AudioSourceError(f"Path is outside the shared audio directories: {path}", 403)
+    if not os.path.isfile(real_path):
+        raise AudioSourceError(f"File not found: {path}", 404)
+    return SpooledAudio(real_path, owned=False)
+
+
+def _download_storage_object(object_path: str, bucket: Optional[str]) -> SpooledAudio:
+    if not SUPABASE_URL or not SUPABASE_SERVICE_ROLE_KEY:
+        raise AudioSourceError("Supabase Storage is not configured on the transcriber", 503)
+
+    object_path = object_path.lstrip("/")
+    if not bucket:
+        bucket, _, object_path = object_path.partition("/")
+    if not bucket or not object_path:
+        raise AudioSourceError("Storage references must name a bucket and an object path")
+
+    url = f"{SUPABASE_URL}/storage/v1/object/{bucket}/{object_path}"
+    return _download(url, _auth_headers_for(url))
+
+
+def _auth_headers_for(url: str) -> dict:
+    """Attach service credentials only when talking to our own Supabase project."""
+    if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY and urlparse(url).netloc == urlparse(SUPABASE_URL).netloc:
+        return {
+            "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+            "apikey": SUPABASE_SERVICE_ROLE_KEY,
+        }
+    return {}
+
+
+def _download(url: str, headers: dict) -> SpooledAudio:
+    spooled = SpooledAudio(new_spool_path(urlparse(url).path))
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with requests.get(url, headers=headers, stream=True, timeout=DOWNLOAD_TIMEOUT) as response:
+            if response.status_code == 404:
+                raise AudioSourceError(f"Audio not found: {url}", 404)
+            if response.status_code >= 400:
+                raise AudioSourceError(f"Fetching audio failed with HTTP {response.status_code}", 502)
+            with open(spooled.path, "wb") as out:
+                for chunk in response.iter_content(chunk_size=UPLOAD_CHUNK_SIZE):
+                    written += len(chunk)
+                    if written > MAX_AUDIO_BYTES:
+                        raise AudioSourceError(f"Audio exceeds {MAX_AUDIO_BYTES} bytes", 413)
+                    digest.update(chunk)
+                    out.write(chunk)
+    except requests.RequestException as e:
+        spooled.cleanup()
+        raise AudioSourceError(f"Fetching audio failed: {e}", 502)
+    except BaseException:
+        spooled.cleanup()
+        raise
+
+    if written == 0:
+        spooled.cleanup()
+        raise AudioSourceError("Fetched audio is empty", 502)
+    spooled.sha256 = digest.hexdigest()
+    return spooled
@@ -0,0 +1,202 @@
+"""
+Dynamic request batching for the Transcriber service.
+
+Short clips leave the GPU mostly idle when each one is decoded on its own.
+The BatchingEngine holds admitted requests for a short window (or until a
+batch is full, or until an inference slot frees up) and hands them to the
+inference queue as a single job. transcribe_batch lays the collected files
+end to end on one timeline, cuts each file into VAD clips that never cross a
+file boundary, and runs every clip through faster-whisper's
+BatchedInferencePipeline in GPU batches. Segments are then scattered back to
+their requests by timeline offset.
+"""
+import asyncio
+import os
+from typing import Callable, List, Optional
+
+import numpy as np
+from faster_whisper import BatchedInferencePipeline, decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps, merge_segments
+
+from inference_queue import InferenceQueue, Ticket, TicketCancelled
+from whisper_engine import profile_options, segment_dict
+
+BATCHING_ENABLED = os.environ.get("BATCHING_ENABLED", "false").lower() == "true"
+# Max VAD clips decoded together in one GPU batch
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", "16"))
+# Max requests gathered into one batched job
+BATCH_MAX_REQUESTS = int(os.environ.get("BATCH_MAX_REQUESTS", "8"))
+BATCH_MAX_WAIT_MS = int(os.environ.get("BATCH_MAX_WAIT_MS", "50"))
+# Batched decoding shares one language across the batch; our content is English
+BATCH_LANGUAGE = os.environ.get("BATCH_LANGUAGE", "en") or None
+
+SAMPLING_RATE = 16000
+CHUNK_LENGTH = 30
+# Silence inserted between requests on the shared timeline
+_GAP_SAMPLES = SAMPLING_RATE
+
+
+def speech_clips(audio: np.ndarray, chunk_length: int = CHUNK_LENGTH) -> List[dict]:
+    """VAD clips in samples, merged up to chunk_length seconds (the pipeline's own rule)."""
+    vad_options = VadOptions(max_speech_duration_s=chunk_length, min_silence_duration_ms=160)
+    active = get_speech_timestamps(audio, vad_options)
+    if not active:
+        return []
+    return merge_segments(active, vad_options)
+
+
+def batch_options(profile: Optional[str]) -> dict:
+    # Language and VAD are fixed by the shared timeline; the rest of the profile applies per clip
+    return {k: v for k, v in profile_options(profile).items() if k not in ("language", "vad_filter")}
+
+
+def transcribe_batch(pipeline: BatchedInferencePipeline, paths: List[str], profile: Optional[str] = None) -> List[dict]:
+    audios = [decode_audio(path, sampling_rate=SAMPLING_RATE) for path in paths]
+
+    clips = []
+    pieces = []
+    offsets = []
+    cursor = 0
+    for audio in audios:
+        offsets.append(cursor)
+        for clip in speech_clips(audio):
+            clips.append({"start": cursor + clip["start"], "end": cursor + clip["end"]})
+        pieces.append(audio)
+        pieces.append(np.zeros(_GAP_SAMPLES, dtype=audio.dtype))
+        cursor += len(audio) + _GAP_SAMPLES
+
+    results = [[] for _ in paths]
+    language = BATCH_LANGUAGE
+    if clips:
+        segments, info = pipeline.transcribe(
+            np.concatenate(pieces),
+            language=BATCH_LANGUAGE,
+            clip_timestamps=clips,
+            vad_filter=False,
+            batch_size=BATCH_MAX_SIZE,
+            **batch_options(profile),
+        )
+        language = info.language
+        bounds = [offset / SAMPLING_RATE for offset in offsets[1:]]
+        for segment in segments:
+            # Clips never straddle a gap, so the segment start identifies its request
+            index = int(np.searchsorted(bounds, segment.start, side="right"))
+            # Times relative to the request's own audio
+            offset = offsets[index] / SAMPLING_RATE
+            results[index].append({
+                **segment_dict(segment),
+                "start": round(segment.start - offset, 3),
+                "end": round(segment.end - offset, 3),
+            })
+
+    return [
+        {
+            "status": "success",
+            "transcription": " ".join(segment["text"] for segment in results[i]),
+            "language": language,
+            "duration": len(audio) / SAMPLING_RATE,
+            "segments": results[i],
+            "batch": {"size": len(paths)},
+        }
+        for i, audio in enumerate(audios)
+    ]
+
+
+def transcribe_batch_with(registry, model_name: str, profile: Optional[str], paths: List[str]) -> List[dict]:
+    # The pipeline is a thin wrapper; not caching it lets the registry unload the model
+    with registry.use(model_name) as model:
+        return transcribe_batch(BatchedInferencePipeline(model=model), paths, profile)
+
+
+class BatchingEngine:
+    """
+    Collects requests for one model and decoding profile and dispatches them
+    as batches through the inference queue. A batch is dispatched when it is
+    full, or when the wait window has elapsed and an inference slot is free;
+    while every slot is busy, requests keep accumulating so the next batch is
+    as large as possible.
+    """
+
+    def __init__(
+        self,
+        inference_queue: InferenceQueue,
+        run_batch: Callable[[List[str]], List[dict]],
+        max_requests: int = BATCH_MAX_REQUESTS,
+        max_wait_ms: int = BATCH_MAX_WAIT_MS,
+    ):
+        self.inference_queue = inference_queue
+        # Blocking batch transcriber: in-process pipeline or a replica dispatcher
+        self.run_batch = run_batch
+        self.max_requests = max(1, max_requests)
+        self.max_wait = max_wait_ms / 1000
+        self._pending = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._window_closed = False
+        self._in_flight = 0
+        self._batches = 0
+        self._batched_requests = 0
+
+    async def submit(self, ticket: Ticket, path: str) -> dict:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((ticket, path, future))
+
+        if len(self._pending) == 1:
+            self._window_closed = False
+            self._timer = loop.call_later(self.max_wait, self._on_window_closed)
+        self._maybe_dispatch()
+        return await future
+
+    def _on_window_closed(self):
+        self._timer = None
+        self._window_closed = True
+        self._maybe_dispatch()
+
+    def _maybe_dispatch(self):
+        while self._pending and self._in_flight < self.inference_queue.concurrency:
+            if len(self._pending) < self.max_requests and not self._window_closed:
+                return
+            batch = self._pending[:self.max_requests]
+            self._pending = self._pending[self.max_requests:]
+            if not self._pending:
+                if self._timer:
+                    self._timer.cancel()
+                    self._timer = None
+                self._window_closed = False
+            self._in_flight += 1
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        tickets = [ticket for ticket, _, _ in batch]
+        paths = [path for _, path, _ in batch]
+        try:
+            results = await self.inference_queue.run_batch(tickets, self.run_batch, paths)
+        except Exception as e:
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        else:
+            self._batches += 1
+            self._batched_requests += len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if result is None:
+                    future.set_exception(TicketCancelled())
+                else:
+                    future.set_result(result)
+        finally:
+            self._in_flight -= 1
+            self._maybe_dispatch()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": True,
+            "pending": len(self._pending),
+            "in_flight": self._in_flight,
+            "batches": self._batches,
+            "avg_batch_size": round(self._batched_requests / self._batches, 2) if self._batches else 0.0,
+            "max_requests": self.max_requests,
+            "max_batch_size": BATCH_MAX_SIZE,
+            "max_wait_ms": int(self.max_wait * 1000),
+        }
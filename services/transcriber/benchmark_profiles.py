@@ -0,0 +1,134 @@
+"""
+Decoding profile benchmark for the Transcriber service.
+
+Runs every fixture through each decoding profile and reports real-time
+factor (decode seconds / audio seconds, lower is faster) and word error
+rate against a reference transcript. A fixture is an audio file with a
+matching .txt reference next to it, e.g. stable_tour_01.mp3 and
+stable_tour_01.txt.
+
+Usage (inside the transcriber container):
+    python3 benchmark_profiles.py /app/input/fixtures
+    python3 benchmark_profiles.py /app/input/fixtures --profiles fast --model small.en --json results.json
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from dataclasses import replace
+from typing import List, Tuple
+
+from whisper_engine import DECODING_PROFILES, config_from_env, load_model, transcribe_file
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".m4a", ".flac", ".ogg", ".mp4")
+
+
+def find_fixtures(directory: str) -> List[Tuple[str, str]]:
+    fixtures = []
+    for name in sorted(os.listdir(directory)):
+        stem, ext = os.path.splitext(name)
+        reference = os.path.join(directory, stem + ".txt")
+        if ext.lower() in AUDIO_EXTENSIONS and os.path.isfile(reference):
+            fixtures.append((os.path.join(directory, name), reference))
+    return fixtures
+
+
+def normalise_words(text: str) -> List[str]:
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+
+def word_errors(reference: List[str], hypothesis: List[str]) -> int:
+    """Word-level Levenshtein distance (substitutions + insertions + deletions)."""
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_word in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hypothesis, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (ref_word != hyp_word),
+            ))
+        previous = current
+    return previous[-1]
+
+
+def benchmark_profile(model, profile: str, fixtures: List[Tuple[str, str]]) -> dict:
+    decode_seconds = 0.0
+    audio_seconds = 0.0
+    errors = 0
+    reference_words = 0
+    files = []
+    for audio_path, reference_path in fixtures:
+        with open(reference_path, encoding="utf-8") as f:
+            reference = normalise_words(f.read())
+
+        started = time.perf_counter()
+        result = transcribe_file(model, audio_path, profile)
+        elapsed = time.perf_counter() - started
+
+        file_errors = word_errors(reference, normalise_words(result["transcription"]))
+        decode_seconds += elapsed
+        audio_seconds += result["duration"]
+        errors += file_errors
+        reference_words += len(reference)
+        files.append({
+            "file": os.path.basename(audio_path),
+            "rtf": round(elapsed / result["duration"], 4) if result["duration"] else None,
+            "wer": round(file_errors / len(reference), 4) if reference else None,
+        })
+
+    return {
+        "profile": profile,
+        "files": files,
+        "audio_seconds": round(audio_seconds, 1),
+        "decode_seconds": round(decode_seconds, 1),
+        "rtf": round(decode_seconds / audio_seconds, 4) if audio_seconds else None,
+        "wer": round(errors / reference_words, 4) if reference_words else None,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Compare decoding profiles by real-time factor and WER")
+    parser.add_argument("fixtures", help="Directory of audio files with matching .txt references")
+    parser.add_argument("--profiles", default=",".join(DECODING_PROFILES),
+                        help="Comma-separated profiles to run (default: all)")
+    parser.add_argument("--model", help="Whisper model to load (default: WHISPER_MODEL)")
+    parser.add_argument("--json", dest="json_path", help="Also write the full results to this file")
+    args = parser.parse_args()
+
+    fixtures = find_fixtures(args.fixtures)
+    if not fixtures:
+        print(f"No fixtures (audio + .txt reference) found in {args.fixtures}")
+        return 1
+    profiles = [p.strip() for p in args.profiles.split(",") if p.strip()]
+    unknown = [p for p in profiles if p not in DECODING_PROFILES]
+    if unknown:
+        print(f"Unknown profiles: {', '.join(unknown)} (known: {', '.join(DECODING_PROFILES)})")
+        return 1
+
+    config = config_from_env()
+    if args.model:
+        config = replace(config, model_name=args.model)
+    print(f"Loading {config.model_name} on {config.device} ({config.compute_type}); {len(fixtures)} fixtures")
+    model = load_model(config)
+    # Warm-up so the first profile does not pay for kernel initialisation
+    transcribe_file(model, fixtures[0][0], profiles[0])
+
+    results = [benchmark_profile(model, profile, fixtures) for profile in profiles]
+
+    print(f"\n{'profile':<12}{'rtf':>8}{'wer':>8}{'audio s':>10}{'decode s':>10}")
+    for result in results:
+        print(f"{result['profile']:<12}{result['rtf'] or 0:>8.3f}{result['wer'] or 0:>8.3f}"
+              f"{result['audio_seconds']:>10.1f}{result['decode_seconds']:>10.1f}")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"model": config.model_name, "engine": config.describe(), "results": results}, f, indent=2)
+        print(f"\nResults written to {args.json_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
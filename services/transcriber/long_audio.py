@@ -0,0 +1,135 @@
+"""
+Long-audio mode for the Transcriber service.
+
+A single sequential pass over a 30-minute stable tour leaves every other
+core (or replica) idle. Long recordings are instead split on voice-activity
+boundaries into chunks of roughly LONG_AUDIO_CHUNK_SECONDS, transcribed
+concurrently, and stitched back into one transcript with absolute
+timestamps. Where no silence is available for a cut, chunks overlap by
+LONG_AUDIO_OVERLAP_SECONDS and the overlap is de-duplicated on stitching.
+"""
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+from faster_whisper import decode_audio
+from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+LONG_AUDIO_THRESHOLD_SECONDS = float(os.environ.get("LONG_AUDIO_THRESHOLD_SECONDS", "600"))
+LONG_AUDIO_CHUNK_SECONDS = float(os.environ.get("LONG_AUDIO_CHUNK_SECONDS", "120"))
+LONG_AUDIO_MAX_CHUNK_SECONDS = float(os.environ.get("LONG_AUDIO_MAX_CHUNK_SECONDS", "180"))
+LONG_AUDIO_OVERLAP_SECONDS = float(os.environ.get("LONG_AUDIO_OVERLAP_SECONDS", "2"))
+# 0 = one chunk in flight per available worker (replicas or NUM_WORKERS)
+LONG_AUDIO_PARALLELISM = int(os.environ.get("LONG_AUDIO_PARALLELISM", "0"))
+
+SAMPLING_RATE = 16000
+
+# (audio slice) -> (segments with chunk-relative times, info)
+ChunkTranscriber = Callable[[np.ndarray], Tuple[List[dict], dict]]
+
+
+@dataclass
+class Chunk:
+    start: int       # Audio slice, in samples
+    end: int
+    keep_start: int  # Segments starting inside [keep_start, keep_end) belong to this chunk
+    keep_end: int
+    has_speech: bool = True
+
+
+def probe_duration(path: str) -> Optional[float]:
+    """Container duration in seconds without decoding the audio."""
+    try:
+        import av
+        with av.open(path) as container:
+            if container.duration:
+                return container.duration / av.time_base
+    except Exception:
+        pass
+    return None
+
+
+def plan_chunks(audio: np.ndarray) -> List[Chunk]:
+    total = len(audio)
+    target = int(LONG_AUDIO_CHUNK_SECONDS * SAMPLING_RATE)
+    longest = int(LONG_AUDIO_MAX_CHUNK_SECONDS * SAMPLING_RATE)
+    overlap = int(LONG_AUDIO_OVERLAP_SECONDS * SAMPLING_RATE)
+
+    speech = get_speech_timestamps(audio, VadOptions(min_silence_duration_ms=300))
+    # Candidate cut points: the middle of every silence between speech regions
+    cuts = [(a["end"] + b["start"]) // 2 for a, b in zip(speech, speech[1:])]
+
+    chunks = []
+    start = 0
+    keep_start = 0
+    while total - start > longest:
+        candidates = [c for c in cuts if start + target // 2 <= c <= start + longest]
+        if candidates:
+            cut = min(candidates, key=lambda c: abs(c - (start + target)))
+            chunks.append(Chunk(start, cut, keep_start, cut))
+            start = keep_start = cut
+        else:
+            # Continuous speech: hard cut, overlapping both neighbours
+            cut = start + target
+            chunks.append(Chunk(start, min(total, cut + overlap), keep_start, cut))
+            start, keep_start = cut - overlap, cut
+    chunks.append(Chunk(start, total, keep_start, total))
+
+    for chunk in chunks:
+        chunk.has_speech = any(s["start"] < chunk.end and s["end"] > chunk.start for s in speech)
+    return chunks
+
+
+def _normalise(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def stitch(chunks: List[Chunk], results: List[List[dict]]) -> List[dict]:
+    stitched = []
+    for chunk, segments in zip(chunks, results):
+        offset = chunk.start / SAMPLING_RATE
+        keep_start = chunk.keep_start / SAMPLING_RATE
+        keep_end = chunk.keep_end / SAMPLING_RATE
+        for segment in segments:
+            start = segment["start"] + offset
+            if not keep_start <= start < keep_end:
+                continue
+            if stitched and _normalise(stitched[-1]["text"]) == _normalise(segment["text"]) \
+                    and start - stitched[-1]["start"] < LONG_AUDIO_OVERLAP_SECONDS * 2:
+                # Same words decoded on both sides of an overlapping cut
+                continue
+            stitched.append({**segment, "start": round(start, 3), "end": round(segment["end"] + offset, 3)})
+    return stitched
+
+
+def transcribe_long(path: str, transcribe_chunk: ChunkTranscriber, parallelism: int) -> dict:
+    audio = decode_audio(path, sampling_rate=SAMPLING_RATE)
+    chunks = plan_chunks(audio)
+    parallelism = max(1, LONG_AUDIO_PARALLELISM or parallelism)
+
+    def run(chunk: Chunk):
+        if not chunk.has_speech:
+            return [], None
+        return transcribe_chunk(audio[chunk.start:chunk.end])
+
+    with ThreadPoolExecutor(max_workers=min(parallelism, len(chunks))) as pool:
+        outputs = list(pool.map(run, chunks))
+
+    segments = stitch(chunks, [segments for segments, _ in outputs])
+    languages = Counter(info["language"] for _, info in outputs if info)
+
+    return {
+        "status": "success",
+        "transcription": " ".join(segment["text"] for segment in segments),
+        "language": languages.most_common(1)[0][0] if languages else None,
+        "duration": len(audio) / SAMPLING_RATE,
+        "segments": segments,
+        "long_audio": {
+            "chunks": len(chunks),
+            "skipped_silent_chunks": sum(1 for chunk in chunks if not chunk.has_speech),
+            "parallelism": parallelism,
+        },
+    }
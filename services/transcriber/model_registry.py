@@ -0,0 +1,231 @@
+"""
+Whisper model registry and request routing for the Transcriber service.
+
+Instead of one model for every request, the service hosts a small set of
+models (e.g. small.en, medium.en, large-v3). Models are loaded lazily and
+kept under a memory budget; idle models are unloaded least recently used
+first. The router picks a model per request from an explicit quality tier,
+the audio duration, and optionally a language check, so a 20-second voice
+note does not pay large-model latency.
+"""
+import gc
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Tuple
+
+from whisper_engine import WHISPER_WARMUP, EngineConfig, load_model, warm_up
+
+
+def _parse_mapping(spec: str) -> Dict[str, str]:
+    pairs = (item.split("=", 1) for item in spec.split(",") if "=" in item)
+    return {key.strip(): value.strip() for key, value in pairs}
+
+
+DEFAULT_MODEL = os.environ.get("WHISPER_MODEL", "large-v3")
+WHISPER_MODELS = [
+    name.strip() for name in os.environ.get("WHISPER_MODELS", DEFAULT_MODEL).split(",") if name.strip()
+]
+# 0 = no budget; every requested model stays loaded
+MODEL_MEMORY_BUDGET_MB = int(os.environ.get("MODEL_MEMORY_BUDGET_MB", "0"))
+
+# Approximate resident size per model in MB (int8); override with WHISPER_MODEL_SIZES_MB
+MODEL_SIZES_MB = {
+    "tiny": 75, "tiny.en": 75,
+    "base": 145, "base.en": 145,
+    "small": 480, "small.en": 480,
+    "medium": 1500, "medium.en": 1500,
+    "large-v1": 3000, "large-v2": 3000, "large-v3": 3000,
+    "distil-large-v3": 1500, "large-v3-turbo": 1600,
+}
+MODEL_SIZES_MB.update({
+    name: int(size) for name, size in _parse_mapping(os.environ.get("WHISPER_MODEL_SIZES_MB", "")).items()
+})
+
+# Routing: tier -> model, e.g. "fast=small.en,standard=medium.en,best=large-v3"
+ROUTE_TIERS = _parse_mapping(os.environ.get("ROUTE_TIERS", ""))
+# Clips shorter than ROUTE_SHORT_SECONDS go to ROUTE_SHORT_MODEL (disabled when unset)
+ROUTE_SHORT_MODEL = os.environ.get("ROUTE_SHORT_MODEL", "")
+ROUTE_SHORT_SECONDS = float(os.environ.get("ROUTE_SHORT_SECONDS", "60"))
+# English-only models are swapped for ROUTE_MULTILINGUAL_MODEL when the detector
+# (a small multilingual model) is not confident the audio is English
+ROUTE_LANGUAGE_MODEL = os.environ.get("ROUTE_LANGUAGE_MODEL", "")
+ROUTE_MULTILINGUAL_MODEL = os.environ.get("ROUTE_MULTILINGUAL_MODEL", "large-v3")
+ROUTE_MIN_LANGUAGE_PROBABILITY = float(os.environ.get("ROUTE_MIN_LANGUAGE_PROBABILITY", "0.8"))
+
+
+class UnknownModelError(ValueError):
+    pass
+
+
+class _Entry:
+    def __init__(self, name: str):
+        self.name = name
+        self.model = None
+        self.in_use = 0
+        self.last_used = 0.0
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.loads = 0
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(
+        self,
+        config: EngineConfig,
+        models: List[str] = WHISPER_MODELS,
+        budget_mb: int = MODEL_MEMORY_BUDGET_MB,
+    ):
+        self.config = config
+        self.default_model = config.model_name
+        self.budget_mb = budget_mb
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        for name in dict.fromkeys([config.model_name, *models]):
+            self._entries[name] = _Entry(name)
+
+    @property
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def size_mb(self, name: str) -> int:
+        return MODEL_SIZES_MB.get(name, 1500)
+
+    @contextmanager
+    def use(self, name: Optional[str] = None):
+        """Yield a loaded model, loading it (and unloading idle ones) if needed."""
+        entry = self._entries.get(name or self.default_model)
+        if entry is None:
+            raise UnknownModelError(f"Model not in registry: {name}")
+
+        with self._lock:
+            entry.in_use += 1
+        try:
+            with entry.lock:
+                if entry.model is None:
+                    self._make_room(entry)
+                    started = time.monotonic()
+                    print(f"Loading Whisper model {entry.name} ({self.size_mb(entry.name)} MB est.)")
+                    model = load_model(replace(self.config, model_name=entry.name))
+                    entry.load_seconds = round(time.monotonic() - started, 2)
+                    if WHISPER_WARMUP:
+                        entry.warmup_seconds = round(warm_up(model), 2)
+                    entry.model = model
+                    entry.loads += 1
+            with self._lock:
+                entry.last_used = time.monotonic()
+            yield entry.model
+        finally:
+            with self._lock:
+                entry.in_use -= 1
+
+    def preload(self, name: Optional[str] = None) -> dict:
+        """Load (and warm up) a model now. Returns its load and warm-up timings."""
+        with self.use(name):
+            pass
+        entry = self._entries[name or self.default_model]
+        return {"load_seconds": entry.load_seconds or 0.0, "warmup_seconds": entry.warmup_seconds}
+
+    def _make_room(self, incoming: _Entry):
+        if not self.budget_mb:
+            return
+        with self._lock:
+            loaded = [e for e in self._entries.values() if e.model is not None and e is not incoming]
+            used = sum(self.size_mb(e.name) for e in loaded)
+            needed = self.size_mb(incoming.name)
+            for victim in sorted(loaded, key=lambda e: e.last_used):
+                if used + needed <= self.budget_mb:
+                    break
+                if victim.in_use:
+                    continue
+                print(f"Unloading Whisper model {victim.name} to stay within {self.budget_mb} MB")
+                victim.model = None
+                used -= self.size_mb(victim.name)
+            if used + needed > self.budget_mb:
+                print(f"WARNING: loading {incoming.name} exceeds the model memory budget "
+                      f"({used + needed} > {self.budget_mb} MB); all other models are busy")
+        gc.collect()
+
+    def is_loaded(self, name: Optional[str] = None) -> bool:
+        entry = self._entries.get(name or self.default_model)
+        return entry is not None and entry.model is not None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default": self.default_model,
+                "budget_mb": self.budget_mb,
+                "models": {
+                    e.name: {
+                        "loaded": e.model is not None,
+                        "in_use": e.in_use,
+                        "size_mb": self.size_mb(e.name),
+                        "loads": e.loads,
+                        "load_seconds": e.load_seconds,
+                        "warmup_seconds": e.warmup_seconds,
+                    }
+                    for e in self._entries.values()
+                },
+            }
+
+
+class ModelRouter:
+    """
+    Chooses a model per request, in order of precedence:
+    explicit model > quality tier > short-clip rule > default,
+    then swaps English-only models for a multilingual one when the
+    language detector is not confident the audio is English.
+    """
+
+    def __init__(self, names: List[str], default_model: str):
+        self.names = names
+        self.default_model = default_model
+        self.decisions: Dict[str, int] = {}
+        for model in [*ROUTE_TIERS.values(), ROUTE_SHORT_MODEL, ROUTE_LANGUAGE_MODEL]:
+            if model and model not in names:
+                raise UnknownModelError(f"Routing refers to {model}, which is not in WHISPER_MODELS")
+        if ROUTE_LANGUAGE_MODEL and ROUTE_MULTILINGUAL_MODEL not in names:
+            raise UnknownModelError(f"ROUTE_MULTILINGUAL_MODEL {ROUTE_MULTILINGUAL_MODEL} is not in WHISPER_MODELS")
+
+    def route(
+        self,
+        duration: Optional[float],
+        tier: Optional[str] = None,
+        model: Optional[str] = None,
+        detect_language: Optional[Callable[[str], Tuple[str, float]]] = None,
+    ) -> Tuple[str, str]:
+        """Returns (model name, reason). detect_language(model) -> (language, probability)."""
+        if model:
+            if model not in self.names:
+                raise UnknownModelError(f"Model not in registry: {model}")
+            chosen, reason = model, "explicit"
+        elif tier:
+            if tier not in ROUTE_TIERS:
+                raise UnknownModelError(f"Unknown quality tier: {tier} (known: {sorted(ROUTE_TIERS)})")
+            chosen, reason = ROUTE_TIERS[tier], f"tier:{tier}"
+        elif ROUTE_SHORT_MODEL and duration is not None and duration < ROUTE_SHORT_SECONDS:
+            chosen, reason = ROUTE_SHORT_MODEL, f"duration<{ROUTE_SHORT_SECONDS:g}s"
+        else:
+            chosen, reason = self.default_model, "default"
+
+        if ROUTE_LANGUAGE_MODEL and detect_language and chosen.endswith(".en") and reason != "explicit":
+            language, probability = detect_language(ROUTE_LANGUAGE_MODEL)
+            if language != "en" or probability < ROUTE_MIN_LANGUAGE_PROBABILITY:
+                chosen, reason = ROUTE_MULTILINGUAL_MODEL, f"language:{language}@{probability:.2f}"
+
+        self.decisions[reason] = self.decisions.get(reason, 0) + 1
+        return chosen, reason
+
+    def stats(self) -> dict:
+        return {
+            "tiers": ROUTE_TIERS,
+            "short_model": ROUTE_SHORT_MODEL or None,
+            "short_seconds": ROUTE_SHORT_SECONDS,
+            "language_model": ROUTE_LANGUAGE_MODEL or None,
+            "multilingual_model": ROUTE_MULTILINGUAL_MODEL if ROUTE_LANGUAGE_MODEL else None,
+            "decisions": dict(self.decisions),
+        }
@@ -0,0 +1,131 @@
+"""
+Local Whisper model store for the Transcriber service.
+
+At runtime models are loaded strictly from the mounted cache directory,
+never from the network, so a restart cannot stall on (or silently pick up a
+different revision from) the Hugging Face Hub. Every model directory is
+checked against a SHA-256 manifest written when the model was fetched, and
+a truncated or corrupted file fails the load instead of a later request.
+
+Fetch models (with network) into the cache before deploying:
+    python3 model_store.py fetch medium.en small.en
+Re-check what is on disk:
+    python3 model_store.py verify medium.en
+"""
+import hashlib
+import os
+import sys
+from typing import Dict
+
+from faster_whisper.utils import download_model
+
+WHISPER_CACHE_DIR = os.environ.get("WHISPER_CACHE_DIR", "/root/.cache/whisper")
+# Offline by default: a missing model is a deployment error, not something to download mid-request
+WHISPER_OFFLINE = os.environ.get("WHISPER_OFFLINE", "true").lower() == "true"
+WHISPER_VERIFY_CHECKSUMS = os.environ.get("WHISPER_VERIFY_CHECKSUMS", "true").lower() == "true"
+
+_HASH_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+class ModelStoreError(RuntimeError):
+    pass
+
+
+def manifest_path(model_name: str) -> str:
+    safe_name = model_name.replace("/", "--")
+    return os.path.join(WHISPER_CACHE_DIR, "checksums", f"{safe_name}.sha256")
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_directory(model_dir: str) -> Dict[str, str]:
+    checksums = {}
+    for root, _, files in os.walk(model_dir):
+        for name in files:
+            path = os.path.join(root, name)
+            checksums[os.path.relpath(path, model_dir)] = hash_file(path)
+    return checksums
+
+
+def write_manifest(model_name: str, model_dir: str) -> str:
+    path = manifest_path(model_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        for name, checksum in sorted(hash_directory(model_dir).items()):
+            f.write(f"{checksum}  {name}\n")
+    return path
+
+
+def read_manifest(model_name: str) -> Dict[str, str]:
+    path = manifest_path(model_name)
+    if not os.path.isfile(path):
+        raise ModelStoreError(
+            f"No checksum manifest for {model_name} at {path}; run 'python3 model_store.py fetch {model_name}'"
+        )
+    checksums = {}
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                checksum, name = line.rstrip("\n").split("  ", 1)
+                checksums[name] = checksum
+    return checksums
+
+
+def verify_model(model_name: str, model_dir: str):
+    expected = read_manifest(model_name)
+    for name, checksum in expected.items():
+        path = os.path.join(model_dir, name)
+        if not os.path.isfile(path):
+            raise ModelStoreError(f"{model_name}: {name} is missing from {model_dir}")
+        if hash_file(path) != checksum:
+            raise ModelStoreError(f"{model_name}: checksum mismatch for {name}")
+
+
+def resolve_model_path(model_name: str) -> str:
+    """Local directory for a model, verified against its manifest when enabled."""
+    if os.path.isdir(model_name):
+        return model_name
+    try:
+        model_dir = download_model(model_name, local_files_only=WHISPER_OFFLINE, cache_dir=WHISPER_CACHE_DIR)
+    except Exception as e:
+        if WHISPER_OFFLINE:
+            raise ModelStoreError(f"{model_name} is not in {WHISPER_CACHE_DIR} (offline mode): {e}")
+        raise
+    if WHISPER_VERIFY_CHECKSUMS:
+        verify_model(model_name, model_dir)
+    return model_dir
+
+
+def fetch(model_name: str) -> str:
+    model_dir = download_model(model_name, cache_dir=WHISPER_CACHE_DIR)
+    return write_manifest(model_name, model_dir)
+
+
+def main() -> int:
+    if len(sys.argv) < 3 or sys.argv[1] not in ("fetch", "verify"):
+        print("Usage: python3 model_store.py fetch|verify <model> [<model> ...]")
+        return 2
+    command, models = sys.argv[1], sys.argv[2:]
+    failed = False
+    for model_name in models:
+        try:
+            if command == "fetch":
+                print(f"{model_name}: fetched, manifest written to {fetch(model_name)}")
+            else:
+                model_dir = download_model(model_name, local_files_only=True, cache_dir=WHISPER_CACHE_DIR)
+                verify_model(model_name, model_dir)
+                print(f"{model_name}: OK ({model_dir})")
+        except Exception as e:
+            print(f"{model_name}: FAILED: {e}")
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,253 @@
+"""
+Multi-replica Whisper workers for the Transcriber service.
+
+Each replica is a separate process holding its own model, pinned to its own
+set of CPU cores (or GPU index), so transcription scales across commodity
+cores when the GPU queue is saturated. The pool's dispatcher sends each
+job to the replica with the fewest outstanding jobs.
+"""
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from dataclasses import replace
+from typing import Callable, List, Optional, Set
+
+from model_registry import ModelRegistry
+from whisper_engine import EngineConfig, detect_language, stream_segments, transcribe_file, transcribe_segments
+
+WHISPER_REPLICAS = int(os.environ.get("WHISPER_REPLICAS", "1"))
+# Optional explicit core sets, e.g. "0-3;4-7". Defaults to an even split of
+# the cores this process may run on.
+REPLICA_CORE_SETS = os.environ.get("REPLICA_CORE_SETS", "")
+
+# Per-process state inside a replica
+_registry = None
+_replica_info = {}
+
+
+def parse_core_sets(spec: str) -> List[Set[int]]:
+    core_sets = []
+    for group in filter(None, (g.strip() for g in spec.split(";"))):
+        cores = set()
+        for part in group.split(","):
+            if "-" in part:
+                start, end = part.split("-", 1)
+                cores.update(range(int(start), int(end) + 1))
+            else:
+                cores.add(int(part))
+        core_sets.append(cores)
+    return core_sets
+
+
+def split_cores(replicas: int) -> List[Set[int]]:
+    available = sorted(os.sched_getaffinity(0))
+    per_replica = max(1, len(available) // replicas)
+    return [
+        set(available[i * per_replica:(i + 1) * per_replica] or available)
+        for i in range(replicas)
+    ]
+
+
+def _init_replica(config: EngineConfig, cores: Optional[Set[int]], index: int):
+    global _registry, _replica_info
+    if cores:
+        os.sched_setaffinity(0, cores)
+    # Each replica hosts its own registry; only the default model is loaded up front
+    _registry = ModelRegistry(config)
+    timings = _registry.preload()
+    _replica_info = {
+        "replica": index,
+        "pid": os.getpid(),
+        "cores": sorted(cores) if cores else None,
+        "cpu_threads": config.cpu_threads,
+        "device": config.device,
+        "device_index": config.device_index,
+        **timings,
+    }
+
+
+def _replica_ping() -> dict:
+    return {**_replica_info, "registry": _registry.stats()}
+
+
+def _replica_transcribe(path: str, model_name: str, profile: str) -> dict:
+    with _registry.use(model_name) as model:
+        return transcribe_file(model, path, profile)
+
+
+def _replica_transcribe_segments(audio, model_name: str, profile: str) -> tuple:
+    with _registry.use(model_name) as model:
+        return transcribe_segments(model, audio, profile)
+
+
+def _replica_detect_language(path: str, model_name: str) -> tuple:
+    with _registry.use(model_name) as model:
+        return detect_language(model, path)
+
+
+def _replica_stream(path: str, model_name: str, profile: str, events, stop) -> int:
+    try:
+        with _registry.use(model_name) as model:
+            return stream_segments(model, path, events.put, stop.is_set, profile)
+    finally:
+        events.put(None)
+
+
+def _replica_transcribe_batch(paths: List[str], model_name: str, profile: str) -> List[dict]:
+    from batching import transcribe_batch_with
+    return transcribe_batch_with(_registry, model_name, profile, paths)
+
+
+class Replica:
+    def __init__(self, index: int, config: EngineConfig, cores: Optional[Set[int]]):
+        self.index = index
+        self.config = config
+        self.cores = cores
+        self.outstanding = 0
+        self.completed = 0
+        self.restarts = 0
+        self.info = {}
+        self.executor = self._spawn()
+
+    def _spawn(self) -> ProcessPoolExecutor:
+        # spawn, not fork: CUDA and ctranslate2 thread pools do not survive fork
+        return ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_replica,
+            initargs=(self.config, self.cores, self.index),
+        )
+
+    def restart(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.restarts += 1
+        self.executor = self._spawn()
+
+
+class ReplicaPool:
+    def __init__(self, config: EngineConfig, replicas: int = WHISPER_REPLICAS, core_spec: str = REPLICA_CORE_SETS):
+        core_sets: List[Optional[Set[int]]]
+        if config.device == "cpu":
+            core_sets = parse_core_sets(core_spec) if core_spec else split_cores(replicas)
+            if len(core_sets) != replicas:
+                raise ValueError(f"REPLICA_CORE_SETS defines {len(core_sets)} sets for {replicas} replicas")
+        else:
+            core_sets = [None] * replicas
+
+        cuda_devices = 1
+        if config.device == "cuda":
+            import ctranslate2
+            cuda_devices = max(1, ctranslate2.get_cuda_device_count())
+
+        self._lock = threading.Lock()
+        self._manager = None
+        self.replicas = []
+        for i, cores in enumerate(core_sets):
+            replica_config = replace(
+                config,
+                cpu_threads=config.cpu_threads or (len(cores) if cores else 0),
+                device_index=i % cuda_devices,
+            )
+            self.replicas.append(Replica(i, replica_config, cores))
+
+    @property
+    def size(self) -> int:
+        return len(self.replicas)
+
+    def start(self):
+        """Load every replica's model in parallel and wait until all are ready."""
+        futures = [(replica, replica.executor.submit(_replica_ping)) for replica in self.replicas]
+        for replica, future in futures:
+            replica.info = future.result()
+            print(f"Replica {replica.index} ready: pid {replica.info['pid']}, "
+                  f"cores {replica.info['cores']}, loaded in {replica.info['load_seconds']}s, "
+                  f"warm-up {replica.info['warmup_seconds']}s")
+
+    def _acquire(self) -> Replica:
+        with self._lock:
+            replica = min(self.replicas, key=lambda r: (r.outstanding, r.completed))
+            replica.outstanding += 1
+            return replica
+
+    @contextmanager
+    def _checkout(self):
+        replica = self._acquire()
+        try:
+            yield replica
+        except BrokenProcessPool:
+            print(f"Replica {replica.index} died, restarting")
+            with self._lock:
+                replica.restart()
+            raise
+        finally:
+            with self._lock:
+                replica.outstanding -= 1
+                replica.completed += 1
+
+    def _dispatch(self, fn, *args):
+        # Blocking: called from an inference-queue thread
+        with self._checkout() as replica:
+            return replica.executor.submit(fn, *args).result()
+
+    def _shared(self):
+        with self._lock:
+            if self._manager is None:
+                self._manager = multiprocessing.get_context("spawn").Manager()
+            return self._manager
+
+    def stream(
+        self, path: str, model_name: str, profile: str, emit: Callable[[dict], None], stop: threading.Event
+    ) -> int:
+        """Relay segments from a replica as they are decoded. Blocking."""
+        manager = self._shared()
+        events = manager.Queue()
+        replica_stop = manager.Event()
+        with self._checkout() as replica:
+            future = replica.executor.submit(_replica_stream, path, model_name, profile, events, replica_stop)
+            while True:
+                if stop.is_set():
+                    replica_stop.set()
+                try:
+                    event = events.get(timeout=1)
+                except queue.Empty:
+                    if future.done():
+                        break
+                    continue
+                if event is None:
+                    break
+                emit(event)
+            return future.result()
+
+    def transcribe(self, path: str, model_name: str, profile: str) -> dict:
+        return self._dispatch(_replica_transcribe, path, model_name, profile)
+
+    def transcribe_segments(self, audio, model_name: str, profile: str) -> tuple:
+        return self._dispatch(_replica_transcribe_segments, audio, model_name, profile)
+
+    def detect_language(self, path: str, model_name: str) -> tuple:
+        return self._dispatch(_replica_detect_language, path, model_name)
+
+    def transcribe_batch(self, paths: List[str], model_name: str, profile: str) -> List[dict]:
+        return self._dispatch(_replica_transcribe_batch, paths, model_name, profile)
+
+    def stats(self) -> List[dict]:
+        with self._lock:
+            return [
+                {
+                    **replica.info,
+                    "outstanding": replica.outstanding,
+                    "completed": replica.completed,
+                    "restarts": replica.restarts,
+                }
+                for replica in self.replicas
+            ]
+
+    def shutdown(self):
+        for replica in self.replicas:
+            replica.executor.shutdown(wait=False, cancel_futures=True)
+        if self._manager is not None:
+            self._manager.shutdown()
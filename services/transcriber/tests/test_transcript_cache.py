@@ -0,0 +1,50 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("faster_whisper")
+
+import app  # noqa: E402
+from transcript_cache import TranscriptCache  # noqa: E402
+from whisper_engine import transcribe_file  # noqa: E402
+
+
+class FakeWhisper:
+    def transcribe(self, audio, **options):
+        segments = [
+            SimpleNamespace(start=0.0, end=2.5, text=" Good morning from the stables.", avg_logprob=-0.2),
+            SimpleNamespace(start=2.5, end=5.0, text=" The filly worked well.", avg_logprob=-0.3),
+        ]
+        return iter(segments), SimpleNamespace(language="en", language_probability=0.99, duration=5.0)
+
+
+def replay(cached: dict) -> list:
+    async def collect():
+        return [event async for event in app.replay_cached(cached, "ndjson", {"model": "medium.en"})]
+
+    return [json.loads(line) for line in asyncio.run(collect())]
+
+
+def test_stream_hit_on_entry_written_by_transcribe(tmp_path, monkeypatch):
+    cache = TranscriptCache(path=str(tmp_path / "transcripts.sqlite3"))
+    monkeypatch.setattr(app, "transcript_cache", cache)
+    audio = SimpleNamespace(sha256="a" * 64)
+
+    # /transcribe without batching stores transcribe_file's result under the unbatched key
+    key, cached = asyncio.run(app.lookup_cache(audio, "medium.en", "accurate", False, False))
+    assert cached is None
+    cache.put(key, transcribe_file(FakeWhisper(), "clip.wav", "accurate"))
+
+    # /transcribe/stream looks up the same key and replays every segment
+    _, cached = asyncio.run(app.lookup_cache(audio, "medium.en", "accurate", False, False))
+    events = replay(cached)
+
+    segments = [event for event in events if event["type"] == "segment"]
+    assert [segment["text"] for segment in segments] == [" Good morning from the stables.", " The filly worked well."]
+    assert segments[1]["start"] == 2.5
+    assert events[-1]["type"] == "done"
+    assert events[-1]["segments"] == 2
+    assert events[-1]["transcription"] == " ".join(segment["text"] for segment in segments)
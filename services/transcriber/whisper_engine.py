@@ -0,0 +1,195 @@
+"""
+Whisper model configuration and inference for the Transcriber service.
+
+Resolves the device / compute-type matrix from the environment so the same
+image runs on the RTX node (CUDA) and on CPU-only overflow nodes and CI.
+Inference helpers here take the model explicitly so they can run both in
+the API process and inside replica worker processes.
+"""
+import os
+import time
+from dataclasses import asdict, dataclass
+from typing import Callable, List, Optional, Tuple
+
+import ctranslate2
+import numpy as np
+from faster_whisper import WhisperModel, decode_audio
+
+from model_store import resolve_model_path
+
+# Beam width used by the accurate profile
+BEAM_SIZE = 5
+
+# Named decoding profiles, passed straight to WhisperModel.transcribe.
+# fast: greedy, fixed English, no previous-text conditioning, VAD skips silence.
+# accurate: beam search with automatic language detection.
+DECODING_PROFILES = {
+    "fast": {
+        "beam_size": 1,
+        "best_of": 1,
+        "language": "en",
+        "condition_on_previous_text": False,
+        "vad_filter": True,
+    },
+    "accurate": {
+        "beam_size": BEAM_SIZE,
+    },
+}
+DEFAULT_PROFILE = os.environ.get("DECODING_PROFILE", "accurate")
+
+# Decode a short silent clip right after loading so CUDA / kernel initialisation
+# is paid at startup, not by the first real request
+WHISPER_WARMUP = os.environ.get("WHISPER_WARMUP", "true").lower() == "true"
+WARMUP_SECONDS = 2
+
+# Default compute type per device when COMPUTE_TYPE is not set
+DEFAULT_COMPUTE_TYPES = {
+    "cuda": "int8",
+    "cpu": "int8",
+}
+
+
+class UnknownProfileError(ValueError):
+    pass
+
+
+def profile_options(profile: Optional[str] = None) -> dict:
+    name = profile or DEFAULT_PROFILE
+    if name not in DECODING_PROFILES:
+        raise UnknownProfileError(f"Unknown decoding profile: {name} (known: {sorted(DECODING_PROFILES)})")
+    return dict(DECODING_PROFILES[name])
+
+
+@dataclass
+class EngineConfig:
+    model_name: str
+    device: str
+    compute_type: str
+    cpu_threads: int = 0
+    num_workers: int = 1
+    device_index: int = 0
+
+    def describe(self) -> dict:
+        return asdict(self)
+
+
+def resolve_device(requested: str) -> str:
+    requested = requested.lower()
+    if requested == "auto":
+        return "cuda" if ctranslate2.get_cuda_device_count() > 0 else "cpu"
+    if requested not in DEFAULT_COMPUTE_TYPES:
+        raise ValueError(f"Unsupported WHISPER_DEVICE: {requested}")
+    return requested
+
+
+def resolve_compute_type(device: str, requested: Optional[str]) -> str:
+    compute_type = requested or DEFAULT_COMPUTE_TYPES[device]
+    supported = ctranslate2.get_supported_compute_types(device)
+    if compute_type not in supported and compute_type not in ("default", "auto"):
+        fallback = DEFAULT_COMPUTE_TYPES[device]
+        print(f"WARNING: compute type {compute_type} not supported on {device} "
+              f"(supported: {sorted(supported)}), using {fallback}")
+        compute_type = fallback
+    return compute_type
+
+
+def config_from_env() -> EngineConfig:
+    device = resolve_device(os.environ.get("WHISPER_DEVICE", "auto"))
+    return EngineConfig(
+        model_name=os.environ.get("WHISPER_MODEL", "large-v3"),
+        device=device,
+        compute_type=resolve_compute_type(device, os.environ.get("COMPUTE_TYPE")),
+        cpu_threads=int(os.environ.get("CPU_THREADS", "0")),
+        num_workers=int(os.environ.get("NUM_WORKERS", "1")),
+    )
+
+
+def load_model(config: EngineConfig) -> WhisperModel:
+    # Always a local, checksum-verified directory; never fetched at runtime
+    return WhisperModel(
+        resolve_model_path(config.model_name),
+        device=config.device,
+        device_index=config.device_index,
+        compute_type=config.compute_type,
+        cpu_threads=config.cpu_threads,
+        num_workers=config.num_workers,
+    )
+
+
+def warm_up(model: WhisperModel) -> float:
+    """Run one full encode/decode pass on silence. Returns the seconds it took."""
+    started = time.monotonic()
+    silence = np.zeros(WARMUP_SECONDS * 16000, dtype=np.float32)
+    segments, _ = model.transcribe(silence, beam_size=BEAM_SIZE, language="en")
+    list(segments)
+    return time.monotonic() - started
+
+
+def transcribe_file(model: WhisperModel, path: str, profile: Optional[str] = None) -> dict:
+    # Segments are decoded lazily, so they are consumed here on the worker
+    segments, info = model.transcribe(path, **profile_options(profile))
+    segment_list = [segment_dict(segment) for segment in segments]
+
+    # Collect results; segments are kept so a cached result can be replayed as a stream
+    transcription = " ".join([segment["text"] for segment in segment_list])
+
+    return {
+        "status": "success",
+        "transcription": transcription,
+        "language": info.language,
+        "duration": info.duration,
+        "segments": segment_list
+    }
+
+
+def detect_language(model: WhisperModel, path: str) -> Tuple[str, float]:
+    """Language and probability from the first 30 seconds (multilingual models only)."""
+    audio = decode_audio(path, sampling_rate=16000)[:30 * 16000]
+    language, probability, _ = model.detect_language(audio)
+    return language, probability
+
+
+def segment_dict(segment) -> dict:
+    return {
+        "start": round(segment.start, 3),
+        "end": round(segment.end, 3),
+        "text": segment.text,
+        "avg_logprob": round(segment.avg_logprob, 4),
+    }
+
+
+def transcribe_segments(model: WhisperModel, audio, profile: Optional[str] = None, **options) -> Tuple[List[dict], dict]:
+    """Transcribe a path or 16 kHz array into plain, picklable segment dicts."""
+    segments, info = model.transcribe(audio, **{**profile_options(profile), **options})
+    segment_list = [segment_dict(segment) for segment in segments]
+    return segment_list, {
+        "language": info.language,
+        "language_probability": info.language_probability,
+        "duration": info.duration,
+    }
+
+
+def stream_segments(
+    model: WhisperModel,
+    audio,
+    emit: Callable[[dict], None],
+    should_stop: Optional[Callable[[], bool]] = None,
+    profile: Optional[str] = None,
+    **options,
+) -> int:
+    """Emit an info event, then each segment as soon as it is decoded. Returns the segment count."""
+    segments, info = model.transcribe(audio, **{**profile_options(profile), **options})
+    emit({
+        "type": "info",
+        "language": info.language,
+        "language_probability": info.language_probability,
+        "duration": info.duration,
+    })
+
+    count = 0
+    for segment in segments:
+        if should_stop and should_stop():
+            break
+        emit({"type": "segment", "index": count, **segment_dict(segment)})
+        count += 1
+    return count